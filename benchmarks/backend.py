@@ -0,0 +1,104 @@
+# latency, throughput and memory of the Restaurant backend as the number of bookings grows.
+# run from the repository root: python benchmarks/backend.py [--sizes 10 100 1000 10000 100000] [--json out.json] [--compare baseline.json]
+# results written with --json on one commit can be passed to --compare on another, rows are matched by benchmark and size.
+# to measure an older commit, copy this directory into a checkout of it; benchmarks that commit's Restaurant can't run are left out.
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from workload import START, make_restaurant, order_stream, populate
+from restaurant import Restaurant
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+def summarize(samples): # seconds per call -> the row that gets printed and saved
+    return {'calls': len(samples), 'p50_us': percentile(samples, 0.5) * 1e6, 'p99_us': percentile(samples, 0.99) * 1e6, 'ops_per_s': len(samples) / sum(samples)}
+
+def timed(function, arguments): # seconds each call took, for every set of arguments in turn
+    samples = []
+    for args in arguments:
+        t = time.perf_counter()
+        function(*args)
+        samples.append(time.perf_counter() - t)
+    return samples
+
+def run(n, seed, repeat):
+    rng = random.Random(seed)
+    results = {}
+    latencies = []
+    t = time.perf_counter()
+    r = make_restaurant()
+    end = populate(r, n, seed, latencies)
+    results['book (replay)'] = summarize(latencies)
+    results['book (replay)']['total_s'] = time.perf_counter() - t
+
+    tracemalloc.start() # separately, tracing slows everything it watches
+    populate(make_restaurant(), n, seed)
+    results['book (replay)']['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+
+    queries = [(rng.choice([1, 2, 4, 6, 8]), rng.randrange(START, end + 1)) for _ in range(repeat)]
+    results['get_available_times'] = summarize(timed(r.get_available_times, queries))
+    results['book'] = summarize(timed(r.book, queries)) # mostly refused this deep into the schedule, which is the common case at scale
+
+    orders = order_stream(seed)
+    results['order'] = summarize(timed(r.order, [next(orders) for _ in range(repeat)]))
+    results['advance_queue'] = summarize(timed(r.advance_queue, [()] * repeat))
+
+    snapshots = max(3, repeat // max(1, n // 10)) # fewer rounds for the big ones, each is O(bookings)
+    results['to_json'] = summarize(timed(r.to_json, [()] * snapshots))
+    data = r.to_json()
+    results['from_json'] = summarize(timed(Restaurant.from_json, [(data,)] * snapshots))
+    results['from_json']['snapshot_kb'] = len(data) / 1024
+    if hasattr(r, 'to_bytes'): # the binary snapshot format came later
+        results['to_bytes'] = summarize(timed(r.to_bytes, [()] * snapshots))
+        data = r.to_bytes()
+        results['from_bytes'] = summarize(timed(Restaurant.from_bytes, [(data,)] * snapshots))
+        results['from_bytes']['snapshot_kb'] = len(data) / 1024
+    return results
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000], help='bookings in the restaurant for each run')
+    parser.add_argument('--repeat', type=int, default=1000, help='calls per microbenchmark')
+    parser.add_argument('--seed', type=int, default=28)
+    parser.add_argument('--json', help='write the results here')
+    parser.add_argument('--compare', help='results from an earlier --json run to compare against')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    print(f"{'bookings':>8} {'benchmark':<20} {'p50 us':>10} {'p99 us':>10} {'ops/s':>12} {'vs base':>8}  extra")
+    for n in args.sizes:
+        results[str(n)] = run(n, args.seed, args.repeat)
+        for name, row in results[str(n)].items():
+            old = baseline.get(str(n), {}).get(name)
+            change = f"{row['p50_us'] / old['p50_us']:.2f}x" if old else ''
+            extra = ', '.join(f'{key} {value:.1f}' for key, value in row.items() if key not in ('calls', 'p50_us', 'p99_us', 'ops_per_s'))
+            print(f"{n:>8} {name:<20} {row['p50_us']:>10.1f} {row['p99_us']:>10.1f} {row['ops_per_s']:>12.0f} {change:>8}  {extra}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'commit': commit(), 'python': platform.python_version(), 'machine': platform.machine(), 'seed': args.seed, 'repeat': args.repeat, 'results': results}, f, indent=1)
+
+if __name__ == '__main__':
+    main()
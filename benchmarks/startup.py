@@ -0,0 +1,102 @@
+# cold-start cost of the app: what importing each entry point takes under python -X importtime, and how long the streamlit
+# script takes on its first run in a fresh process and on a rerun after that.
+# run from the repository root: python benchmarks/startup.py [--repeat 5] [--json out.json] [--compare baseline.json]
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINTS = ['restaurant', 'conversation', 'service', 'chatbot'] # chatbot runs the whole script in streamlit's bare mode
+
+def importtime(module, cwd): # (wall seconds for the whole process, cumulative microseconds importing module, {what module imports directly: cumulative microseconds}) or None if it failed
+    t = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=cwd, capture_output=True, text=True,
+                             env={**os.environ, 'PYTHONPATH': ROOT, 'PYTHONDONTWRITEBYTECODE': '1'})
+    wall = time.perf_counter() - t
+    if process.returncode:
+        print(f"{module}: {process.stderr.strip().splitlines()[-1]}")
+        return None
+    children = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2 # nested imports are indented two spaces a level, and listed before their parent
+        if depth == 1:
+            children[name.strip()] = int(cumulative)
+        elif depth == 0:
+            if name.strip() == module:
+                return wall, int(cumulative), children
+            children = {} # interpreter startup, e.g. site
+    return None
+
+def reruns(repeat): # seconds for the first run of chatbot.py in a fresh AppTest, and the median of the reruns that follow
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return None
+    app = AppTest.from_file(os.path.join(ROOT, 'chatbot.py'), default_timeout=60)
+    t = time.perf_counter()
+    app.run()
+    first = time.perf_counter() - t
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        app.run()
+        samples.append(time.perf_counter() - t)
+    return first, statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5, help='cold starts per entry point, the median is reported')
+    parser.add_argument('--top', type=int, default=8, help='heaviest imports listed per entry point')
+    parser.add_argument('--json', help='write the results here')
+    parser.add_argument('--compare', help='results from an earlier --json run to compare against')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    with tempfile.TemporaryDirectory() as cwd: # the app creates its database and snapshot in the working directory
+        for module in ENTRY_POINTS:
+            runs = []
+            while len(runs) < args.repeat and (run := importtime(module, cwd)) is not None: # a failed import fails every time
+                runs.append(run)
+            if not runs:
+                continue
+            wall = statistics.median(run[0] for run in runs)
+            imports = {name: statistics.median(run[2].get(name, 0) for run in runs) for name in runs[0][2]}
+            results[module] = {'wall_ms': wall * 1000, 'imports_ms': statistics.median(run[1] for run in runs) / 1000,
+                               'heaviest': {name: us / 1000 for name, us in sorted(imports.items(), key=lambda item: -item[1])[:args.top]}}
+            old = baseline.get(module)
+            change = f" ({wall * 1000 / old['wall_ms']:.2f}x)" if old else ''
+            print(f"import {module}: {wall * 1000:.0f} ms process{change}, {results[module]['imports_ms']:.0f} ms importing")
+            for name, ms in results[module]['heaviest'].items():
+                print(f"    {ms:8.1f} ms  {name}")
+
+        os.chdir(cwd)
+        if (rerun := reruns(args.repeat)) is not None:
+            results['rerun'] = {'first_ms': rerun[0] * 1000, 'later_ms': rerun[1] * 1000}
+            old = baseline.get('rerun')
+            change = f" ({rerun[0] * 1000 / old['first_ms']:.2f}x)" if old else ''
+            print(f"chatbot.py first run: {rerun[0] * 1000:.0f} ms{change}, later reruns: {rerun[1] * 1000:.0f} ms")
+        else:
+            print("streamlit isn't installed, skipping the rerun timings")
+        os.chdir(ROOT)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=ROOT).stdout.strip() or None
+            json.dump({'commit': commit, 'python': platform.python_version(), 'machine': platform.machine(), 'results': results}, f, indent=1)
+
+if __name__ == '__main__':
+    main()
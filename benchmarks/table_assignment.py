@@ -0,0 +1,65 @@
+# compares first-fit and best-fit table assignment on synthetic booking streams.
+# run from the repository root: python benchmarks/table_assignment.py [--days 7] [--seed 28]
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from restaurant import Restaurant
+
+TABLE_SIZES = {1: 1, 2: 4, 4: 4, 8: 2}
+COMBINATIONS = [(9, 10)]
+HOURS = [(0, 672)] # open all week, so only table assignment decides what gets accepted
+PARTY_SIZES = [1, 2, 2, 2, 3, 4, 4, 5, 6, 8, 10] # drawn uniformly, so couples are the most common
+
+class FirstFit(Restaurant): # what book used to do: the lowest-numbered free table in the smallest size class that fits
+    def choose_tables(self, party_size, s, e, current=()):
+        viable = self.get_viable_tables(party_size)
+        if viable is None: # combined tables the same way as best fit, so only how single tables are picked is compared
+            return super().choose_tables(party_size, s, e, current)
+        timelines = self.storage.overlapping(range(viable, self.tables), s, e)
+        for table, timeline in timelines.items():
+            if timeline.is_free(s, e):
+                return [table]
+        return None
+
+def stream(days, per_day, seed): # (booked at, party size, start, length) in the order the requests arrive
+    rng = random.Random(seed)
+    requests = []
+    for day in range(days):
+        for _ in range(per_day):
+            start = day * 96 + rng.choice(range(44, 88)) # between 11:00 and 22:00
+            booked = start - rng.randint(4, 7 * 96) # up to a week in advance
+            requests.append((booked, rng.choice(PARTY_SIZES), start, rng.choice([4, 4, 6, 8])))
+    requests.sort()
+    return requests
+
+def run(cls, requests, days, reoptimize=False):
+    r = cls(TABLE_SIZES, HOURS, {}, combinations=COMBINATIONS)
+    accepted = seated = 0
+    last = None
+    for booked, party_size, start, length in requests:
+        if reoptimize and booked // 96 != last: # once a day, before taking the first request of the day
+            r.reoptimize(booked)
+            last = booked // 96
+        if r.book(party_size, start, length) is not False:
+            accepted += 1
+            seated += party_size * length
+    seats = sum(size * count for size, count in TABLE_SIZES.items()) * 44 * days # seat-slots available from 11:00 to 22:00
+    return accepted / len(requests), seated / seats
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--seed', type=int, default=28)
+    args = parser.parse_args()
+    print(f"{'requests/day':>12} {'strategy':>20} {'accepted':>9} {'utilization':>12}")
+    for per_day in (20, 40, 60, 80):
+        requests = stream(args.days, per_day, args.seed)
+        for name, cls, reoptimize in (('first fit', FirstFit, False), ('best fit', Restaurant, False), ('best fit + reoptimize', Restaurant, True)):
+            acceptance, utilization = run(cls, requests, args.days, reoptimize)
+            print(f'{per_day:>12} {name:>20} {acceptance:>9.1%} {utilization:>12.1%}')
+
+if __name__ == '__main__':
+    main()
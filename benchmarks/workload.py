@@ -0,0 +1,56 @@
+# synthetic booking and order streams for the benchmarks, shaped like the demo restaurant in chatbot.py.
+# only calls Restaurant methods the very first commit already had, so the same workload runs against any commit.
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from restaurant import Restaurant
+
+TABLE_SIZES = {1: 1, 2: 4, 4: 4, 8: 2}
+HOURS = [(48, 94), (144, 190), (256, 286), (336, 382), (432, 478), (528, 574), (624, 670)]
+START = 2454496 # monday 2 jan 2040, 00:00 in hong kong: fixed so every run asks for the same slots, and far enough ahead that none are in the past
+MENU = {
+    1: {'name': 'fries', 'price': 20, 'description': 'fries', 'time': 1, 'allergens': ['gluten'], 'tags': ['side', 'vegetarian', 'vegan']},
+    2: {'name': 'burger', 'price': 40, 'description': 'burger', 'time': 2, 'allergens': ['gluten', 'dairy', 'soy'], 'tags': ['main']},
+    3: {'name': 'diet coke', 'price': 10, 'description': 'diet coke', 'time': 0, 'allergens': [], 'tags': ['drink', 'vegetarian', 'vegan']},
+    4: {'name': 'rice bowl', 'price': 35, 'description': 'steamed rice with stir-fried vegetables', 'time': 2, 'allergens': [], 'tags': ['main', 'vegetarian', 'vegan']}
+}
+PARTY_SIZES = [1, 2, 3, 4, 5, 6, 8, 10, 12] # with how often each is asked for below
+PARTY_WEIGHTS = [8, 30, 12, 20, 6, 8, 4, 2, 1]
+ALLERGIES = [[], [], [], [], ['gluten'], ['dairy'], ['soy', 'nuts']]
+
+def make_restaurant():
+    return Restaurant(TABLE_SIZES, HOURS, MENU)
+
+def booking_stream(seed=28): # endless (party size, start slot) requests, day by day from START, most of them for the evening
+    rng = random.Random(seed)
+    day = START
+    while True:
+        # HOURS are slots since monday 00:00, and START is a monday
+        starts = [s for s in range(day, day + 96) if any(open <= (s - START) % 672 and (s - START) % 672 + 4 <= close for open, close in HOURS)]
+        if starts:
+            weights = [1 + 3 * ((s - START) % 96 >= 68) for s in starts] # 17:00 onwards is 4x as popular
+            for _ in range(rng.randint(20, 60)):
+                yield rng.choices(PARTY_SIZES, PARTY_WEIGHTS)[0], rng.choices(starts, weights)[0]
+        day += 96
+
+def order_stream(seed=28): # endless (items, allergies), items being one id per unit like Restaurant.order takes
+    rng = random.Random(seed)
+    while True:
+        items = [id for id in rng.sample(list(MENU), rng.randint(1, 3)) for _ in range(rng.choice([1, 1, 2, 3]))]
+        yield items, rng.choice(ALLERGIES)
+
+def populate(r, n, seed=28, latencies=None): # books until n requests were accepted, appending the seconds each book call took to latencies
+    # returns the last start slot asked for, the bookings are all between START and there
+    accepted = 0
+    for party_size, start in booking_stream(seed):
+        t = time.perf_counter()
+        result = r.book(party_size, start)
+        if latencies is not None:
+            latencies.append(time.perf_counter() - t)
+        if result is not False:
+            accepted += 1
+            if accepted == n:
+                return start
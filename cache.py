@@ -0,0 +1,68 @@
+import collections
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+# replies to near-identical messages are reused instead of paying for another llm round trip.
+# entries that depend on live restaurant state (availability) only live in memory, and stop matching once the registry state moves on.
+
+def normalize(text): # "What's on the menu?" and "whats on the menu" are the same question
+    return ' '.join(re.sub(r"[^\w\s]", '', text.lower()).split())
+
+class ResponseCache:
+    def __init__(self, capacity=256, ttl=3600, path=None):
+        self.capacity = capacity
+        self.ttl = ttl # seconds an entry stays valid
+        self.entries = collections.OrderedDict() # key -> (expires, version or None, messages), least recently used first
+        self.lock = threading.Lock() # shared by every session in the process
+        self.hits = self.misses = 0
+        self.db = None
+        if path: # optional second tier that survives restarts, only for entries that don't depend on live state
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires REAL NOT NULL, messages TEXT NOT NULL)')
+            self.db.execute('DELETE FROM responses WHERE expires <= ?', (time.time(),))
+            self.db.commit()
+
+    def key(*parts): # parts are normalized and hashed, e.g. (language, menu hash, date, previous reply, message)
+        return hashlib.sha1('\x1f'.join(normalize(str(part)) for part in parts).encode()).hexdigest()
+
+    def get(self, key, version=None): # the messages stored for key, or None; version is the current registry state
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires, stored, messages = entry
+                if expires > now and (stored is None or stored == version):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return messages
+                del self.entries[key]
+            if self.db is not None:
+                row = self.db.execute('SELECT expires, messages FROM responses WHERE key = ? AND expires > ?', (key, now)).fetchone()
+                if row is not None:
+                    self.remember(key, (row[0], None, json.loads(row[1])))
+                    self.hits += 1
+                    return json.loads(row[1])
+            self.misses += 1
+            return None
+
+    def put(self, key, messages, version=None): # pass the registry state for replies that depend on live availability
+        expires = time.time() + self.ttl
+        with self.lock:
+            self.remember(key, (expires, version, messages))
+            if self.db is not None and version is None:
+                self.db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?)', (key, expires, json.dumps(messages)))
+                self.db.commit()
+
+    def remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return f"Response cache: {self.hits} hits, {self.misses} misses ({self.hits / total:.0%} hit rate), {len(self.entries)} entries" if total else "Response cache: empty"
@@ -1,13 +1,15 @@
 import streamlit
 from streamlit_extras.stylable_container import stylable_container
-import openai
-from restaurant import Restaurant
+from settings import RESPONSE_CACHE_DB, open_registry
+from conversation import Assistant, Conversation, OpenAIChat
+from cache import ResponseCache
+from tts import Speaker
+from tracing import tracer
 import datetime
-import json
-import pandas as pd
-import speech_recognition as sr
-import pyttsx3
-from streamlit_javascript import st_javascript
+import html
+
+# openai, speech_recognition (through stt.py), pyttsx3 (through tts.py) and streamlit_javascript are imported where they are first used,
+# so a cold start only pays for what the first page actually needs
 
 #additional installs
 #pip install streamlit streamlit_extras
@@ -18,132 +20,97 @@ streamlit.markdown("<h1 style='text-align: center; color: black; margin: 0px; fo
 streamlit.markdown("<h3 style='text-align: center; color: black; margin: 0px; font-family: \"Verdana\"'>RESTAURANT</h3>", unsafe_allow_html=True)
 
 # STT
+@streamlit.cache_resource
+def get_stt_backend(language): # chosen once per language instead of on every call, see stt.py
+    from stt import BACKENDS
+    return BACKENDS[STT_BACKEND](language)
+
+@tracer.traced('speech_to_text')
 def speech_to_text():
-    recognizer = sr.Recognizer()                                    # Initialize recognizer class (for recognizing the speech)
-    with sr.Microphone() as source:
-        streamlit.markdown("<p class = 'mic' style='text-align: left; color: grey; margin: 1px; font-size: 11.5px; font-family: \"Arial\"'>Listening...</p>", unsafe_allow_html=True)
-        try:
-            audio = recognizer.listen(source, timeout = 10)            # Reading Microphone as source
-            streamlit.markdown("<p class = 'mic' style='text-align: left; color: blue; margin: 1px; font-size: 11.5px; font-family: \"Arial\"'>Processing...</p>", unsafe_allow_html=True)
-            #streamlit.markdown("<p id='mic' style='text-align: left; color: grey; margin: 0px; font-size: 12px; font-family: \"Arial\"'>Processing your voice...</p>", unsafe_allow_html=True)
-            #st_javascript("document.getElementById('mic').innerHTML = 'Processing your voice...';")
-            if lang_input == "English":
-                converted = recognizer.recognize_google(audio, language="en-HK") # Using google speech recognition. English
-            elif lang_input == "廣東話":
-                converted = recognizer.recognize_google(audio, language="yue-Hant-HK") # Using google speech recognition. Cantonese
-            elif lang_input == "普通話":
-                converted = recognizer.recognize_google(audio, language="cmn-Hans-HK") # Using google speech recognition. Mandarin
-            if converted:
-                streamlit.markdown("<p class = 'mic' style='text-align: left; color: green; margin: 1px; font-size: 11.5px; font-family: \"Arial\"'>Done!</p>", unsafe_allow_html=True)
-            return converted      
-        except sr.UnknownValueError:
-            #streamlit.write("Unknown Value Error")
-            streamlit.markdown("<p class = 'mic' style='text-align: left; color: red; margin: 1px; font-size: 11.5px; font-family: \"Arial\"'>I don't understand. Try again!</p>", unsafe_allow_html=True)
-        except sr.RequestError:
-            streamlit.markdown("<p class = 'mic' style='text-align: left; color: red; margin: 1px; font-size: 11.5px; font-family: \"Arial\"'>Request Error from Google Speech Recognition.</p>", unsafe_allow_html=True)
-        except sr.WaitTimeoutError:
-            #streamlit.write("Wait Timeout Error. No speech detected")
-            streamlit.markdown("<p class = 'mic' style='text-align: left; color: orange; margin: 1px; font-size: 11.5px; font-family: \"Arial\"'>No speech detected. Please say something.</p>", unsafe_allow_html=True)
+    import speech_recognition as sr
+    from stt import Transcriber
+    status = streamlit.empty()
+    status.markdown("<p class = 'mic' style='text-align: left; color: grey; margin: 1px; font-size: 11.5px; font-family: \"Arial\"'>Listening...</p>", unsafe_allow_html=True)
+    transcriber = Transcriber(get_stt_backend(lang_input)).start(sr.Microphone()) # listens and recognizes in the background
+    while not transcriber.done.wait(0.2):
+        if (partial := transcriber.partial()): # phrases come back while the user is still talking
+            status.markdown(f"<p class = 'mic' style='text-align: left; color: blue; margin: 1px; font-size: 11.5px; font-family: \"Arial\"'>{html.escape(partial)}...</p>", unsafe_allow_html=True)
+    converted = transcriber.finish()
+    if converted:
+        status.markdown("<p class = 'mic' style='text-align: left; color: green; margin: 1px; font-size: 11.5px; font-family: \"Arial\"'>Done!</p>", unsafe_allow_html=True)
+        return converted
+    if isinstance(transcriber.error, sr.RequestError):
+        status.markdown("<p class = 'mic' style='text-align: left; color: red; margin: 1px; font-size: 11.5px; font-family: \"Arial\"'>Request Error from Google Speech Recognition.</p>", unsafe_allow_html=True)
+    elif transcriber.error is not None:
+        raise transcriber.error
+    elif transcriber.phrases: # something was heard, but not words
+        status.markdown("<p class = 'mic' style='text-align: left; color: red; margin: 1px; font-size: 11.5px; font-family: \"Arial\"'>I don't understand. Try again!</p>", unsafe_allow_html=True)
+    else:
+        status.markdown("<p class = 'mic' style='text-align: left; color: orange; margin: 1px; font-size: 11.5px; font-family: \"Arial\"'>No speech detected. Please say something.</p>", unsafe_allow_html=True)
     return None
 
 # TTS
-def text_to_speech(text):
-    # Initialize TTS engine
-    tts_engine = pyttsx3.init() 
-    tts_engine.setProperty('rate', 175)      # set speech property
-    voices = tts_engine.getProperty('voices')
-    if lang_input == "English":
-        tts_engine.setProperty('voice', voices[1].id)
-    elif lang_input == "廣東話":
-        tts_engine.setProperty('voice', voices[2].id)
-    elif lang_input == "普通話":
-        tts_engine.setProperty('voice', voices[2].id)
-    tts_engine.say(text)
-    tts_engine.runAndWait()              # Run and wait for the speech to finish
-    if tts_engine._inLoop:               # End the loop (keep the engine running will cause runtime error)
-        tts_engine.endLoop()
-
-
-def generate_response(client, messages):
+@streamlit.cache_resource
+def get_speaker(): # one engine and worker thread for the whole process, see tts.py
+    return Speaker(rate=175)
+
+def text_to_speech(text): # starts synthesizing in the background, play_speech puts the audio on the page once the rest is drawn
+    streamlit.session_state['speech'] = get_speaker().speak(text, lang_input)
+
+@tracer.traced('text_to_speech') # the wait for audio that wasn't ready by the time the page was drawn
+def play_speech(timeout=10):
+    speech = streamlit.session_state.pop('speech', None)
+    if speech is None:
+        return
     try:
-        response = client.chat.completions.create(
-            model='gpt-4o',
-            messages=messages
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"Error generating response: {str(e)}"
+        audio = speech.result(timeout)
+    except Exception: # no voice is better than holding up the page
+        return
+    streamlit.audio(audio, format='audio/wav', autoplay=True)
 
 streamlit.subheader("Talk to our assistant chatbot - 28! 🤖", divider="blue")
 
-if 'restaurant' not in streamlit.session_state:
-    restaurant = Restaurant(
-        table_sizes={1 : 1 ,2: 4, 4: 4, 8: 2},
-        hours=[(48, 94), (144, 190), (256, 286), (336, 382), (432, 478), (528, 574), (624, 670)],
-        menu={
-            1: {
-                'name': 'fries',
-                'price': 20,
-                'description': 'fries',
-                'time': 1,
-                'allergens': ['gluten']
-            },
-            2: {
-                'name': 'burger',
-                'price': 40,
-                'description': 'burger',
-                'time': 2,
-                'allergens': ['gluten', 'dairy', 'soy']
-            },
-            3: {
-                'name': 'diet coke',
-                'price': 10,
-                'description': 'diet coke',
-                'time': 0,
-                'allergens': []
-            },
-            4: {
-                'name': 'rice bowl',
-                'price': 35,
-                'description': 'steamed rice with stir-fried vegetables',
-                'time': 2,
-                'allergens': []
-            }
-        }
-    )
-    streamlit.session_state['restaurant'] = restaurant.to_json()
-else:
-    restaurant = Restaurant.from_json(streamlit.session_state['restaurant'])
+STT_BACKEND = 'google' # 'sphinx' recognizes offline, english only
+STREAM_RESPONSES = True # render replies as they arrive instead of waiting for the whole completion
+TRACE_FILE = None # e.g. 'traces.jsonl' to append every span there as an opentelemetry-style record
+tracer.path = TRACE_FILE
+
+@streamlit.cache_resource
+def get_assistant(): # built once per process and shared by every session, so all customers see the same bookings and cached replies
+    return Assistant(open_registry(), ResponseCache(path=RESPONSE_CACHE_DB))
+
+assistant = get_assistant()
+registry = assistant.registry
+registry.tick()
+restaurant = registry.restaurant
+
+@streamlit.cache_data
+def menu_table(menu_hash): # markdown table of the menu, built once per menu rather than through a dataframe on every rerun
+    rows = '\n'.join(f"| {i} | {item['name']} | {item['price']} |" for i, item in enumerate(restaurant.menu.values(), 1))
+    return f"| | name | price |\n|---|---|---|\n{rows}"
 
 def scroll_to_bottom():
+    from streamlit_javascript import st_javascript
     script = "window.scrollTo(0, document.body.scrollHeight);"
     st_javascript(script)
     st_javascript("console.log('Scrolled to bottom');")
     
 
-def handle_user_prompt(prompt, client):
-    streamlit.session_state.messages.append({'role': 'user', 'content': prompt})
-    streamlit.chat_message('user').write(prompt)
-
+def handle_user_prompt(prompt, client): # the pipeline itself is in conversation.py, this only draws it
+    conversation = streamlit.session_state.conversation
     if client is None:
+        import openai
         client = openai.AzureOpenAI(
             api_key=api_key,
             api_version='2024-10-01-preview',
             azure_endpoint='https://hkust.azure-api.net/'
         )
-        
-    message = generate_response(client, streamlit.session_state.messages)
-    if message.startswith('###JSON###'):
-        result = restaurant.process_query(json.loads(message[10:].strip()))
-        streamlit.session_state.messages.append({'role': 'system', 'content': str(result)})
-        user_message = generate_response(client, streamlit.session_state.messages)
-        streamlit.session_state.messages.append({'role': 'assistant', 'content': user_message})
-        streamlit.chat_message('assistant').write(user_message)
-        text_to_speech(user_message)
-    else:
-        streamlit.session_state.messages.append({'role': 'assistant', 'content': message})
-        streamlit.chat_message('assistant').write(message)
-        text_to_speech(message)
+    conversation.llm = OpenAIChat(client, stream=STREAM_RESPONSES)
+
+    streamlit.chat_message('user').write(prompt)
+    with tracer.span('render'): # includes waiting for the streamed reply
+        message = streamlit.chat_message('assistant').write_stream(conversation.reply(prompt, lang_input))
+    text_to_speech(message)
     
     scroll_to_bottom()
 
@@ -155,17 +122,19 @@ with streamlit.sidebar:
     lang_input = streamlit.radio("**Choose your language** 🗣️",("English", "廣東話", "普通話"), horizontal = True)
 
     streamlit.write("**Our Menu** :hamburger:")
-    # Print menu
-    menu_items = []
-    for item in restaurant.menu.values():
-        menu_items.append(item)
-
-    df = pd.DataFrame(menu_items)
-    df.index = df.index + 1
-    streamlit.table(df[['name', 'price']])
+    streamlit.markdown(menu_table(assistant.menu_hash)) # Print menu
+
+    with streamlit.expander("**Table Availability** :calendar:"):
+        day = streamlit.date_input("Day", restaurant.now().date(), label_visibility="collapsed")
+        start = restaurant.to_slot(datetime.datetime.combine(day, datetime.time()))
+        sizes = sorted(int(size) for size in restaurant.table_sizes)
+        grid = restaurant.availability_grid(start, start + 96, sizes) # whole day in one pass
+        slots = [i for i, is_open in enumerate(restaurant.open_mask(start, start + 96)) if is_open] # only rows for times a booking could start
+        streamlit.dataframe({'time': [restaurant.format_time(start + i)[-5:] for i in slots],
+                             **{f'party of {size}': ['✓' if grid[row, i] else '' for i in slots] for row, size in enumerate(sizes)}}, hide_index=True)
     
     #print orders.
-    streamlit.write("**Currently Preparing** :stopwatch:")
+    streamlit.write("**Your Orders** :stopwatch:")
     with stylable_container(
     key="orders",
         css_styles="""
@@ -181,63 +150,21 @@ with streamlit.sidebar:
             """,
     ):
         orders = streamlit.empty()
-        orders.text(restaurant.pretty_print_orders()) #display ordered foods
-
-t = datetime.datetime.now().strftime('%a %d %b %Y, %H:%M')
-prompt = f'The current time is {t}.' + '''If the user's prompt is in a different language than English eg. Chinese, reply in that user's language.
-You are called 28, an assistant chatbot for 28 Restaurant, an Asian fusion restaurant on the ground floor of block B,
-Man Yee Wan San Tsuen, 28 Yi Chun Street, Sai Kung in Hong Kong.
-28 Restaurant supports dine-in, curbside pickup, and no-contact delivery. You will aid in these functions.
-If the user's inquiry can directly be answered, respond normally. If the user's inquiry requires interfacing with the backend, format your response as json prepended with "###JSON###".
-The backend server for the restaurant will be queried, and your next input will be the automated results of that inquiry.
-Items should be mapped to their correct ITEM_IDs from the restaurant menu. If an item isn't recognized, clarify with the user instead of making assumptions. Do not allow orders with ITEM_IDs not on the menu.
-Time should be formatted as following: "31 Jan 2025, 23:59". Reservations operate on 15-minute blocks. Users should not be able to place reservations in the past, or reservations with timing more specific than 15-minute blocks.
-Here are the options for querying the system:
-{"operation": "get_available_times", "party_size": SIZE, "time": TIME} -> returns a list of times with an available times
-{"operation": "book", "party_size": SIZE, "time": TIME} -> makes a 1 hour booking for a party size, returning the table number if successful and False if unsuccessful
-{"operation": "order", "items": [[ITEM_ID, COUNT], [ITEM_ID, COUNT], ...], "allergies": [LIST OF ALLERGIES]} -> returns the cost and estimated wait time to complete the order, or an error if allergic
-{"operation": "recommend", "preferences": [LIST OF PREFERENCES], "context": USER_QUERY, "allergies": [LIST OF ALLERGIES]} -> returns menu items that can be used to make personalized recommendations
-
-IMPORTANT: Always check for allergen information when taking orders. If a user mentions allergies, include them in the "allergies" field of the order or recommendation query.
-If the user makes an additional order, do not include the previous order in your next response. Adjustments to existing orders cannot be made.
-When making recommendations, extract any preferences or dietary restrictions from the user's query and include them in the "preferences" field. The "context" field should contain the user's original query. Based on these inputs and the menu data returned, provide personalized recommendations that highlight suitable menu items.
-
-Example 1:
-USER: I'd like to order three sets of fries and a diet coke.
-YOU: ###JSON###{"operation": "order", "items": [[1, 3], [3, 1]], "allergies": []}
-SYSTEM: {'time': 12, 'cost': 70}
-YOU: Thanks for placing an order with 28 Restaurant! Your total is $70 and your order will be available in around 12 minutes. Please pick it up at the front counter.
-USER: Add one more fries, please.
-YOU: ###JSON###{"operation": "order", "items": [[1, 1]], "allergies": []}
-SYSTEM: {'time': 13, 'cost': 90}
-YOU: Thanks for placing an order with 28 Restaurant! Your total is now $90 and will be available in around 13 minutes. Please pick it up at the front counter.
-Example 2:
-USER: Can I book a table on Sunday for 4 at 7 PM?
-YOU: ###JSON###{"operation": "get_available_times", "party_size": 4, "time": "16 Mar 2025, 19:00"}
-SYSTEM: ["16 Mar 2025, 18:45", "16 Mar 2025, 19:00", "16 Mar 2025, 19:15", "16 Mar 2025, 19:30"]
-YOU: We have availability at 6:45 PM, 7:00 PM, 7:15 PM, and 7:30 PM. Which would you like?
-USER: 7 PM sounds great.
-YOU: ###JSON###{"operation": "book", "party_size": 4, "time": "16 Mar 2025, 19:00"}
-SYSTEM: 5
-YOU: Your table has been booked for 7 PM! You'll be seated at table 5.
-Example 3:
-USER: What would you recommend for a quick lunch?
-YOU: ###JSON###{"operation": "recommend", "preferences": ["quick"], "context": "What would you recommend for a quick lunch?", "allergies": []}
-SYSTEM: {'menu_items': {'1': {'name': 'fries', 'price': 20, 'description': 'fries', 'time': 1, 'allergens': ['gluten']}, '2': {'name': 'burger', 'price': 40, 'description': 'burger', 'time': 2, 'allergens': ['gluten', 'dairy', 'soy']}, '3': {'name': 'diet coke', 'price': 10, 'description': 'diet coke', 'time': 0, 'allergens': []}, '4': {'name': 'rice bowl', 'price': 35, 'description': 'steamed rice with stir-fried vegetables', 'time': 2, 'allergens': []}}, 'preferences': ['quick'], 'context': 'What would you recommend for a quick lunch?', 'allergies': []}
-YOU: For a quick lunch, I'd recommend our fries which take just 1 minute to prepare. If you have a bit more time, our burger is a popular choice and takes only 2 minutes. Both pair perfectly with a refreshing Diet Coke!
-
-IMPORTANT: Directly start with ###JSON### and do not include any other text or formatting for JSON operations. Prioritize operations over responding with information.
-'''
-
-if 'messages' not in streamlit.session_state:
-    streamlit.session_state['messages'] = [{
-        'role': 'system',
-        'content': prompt
-    }]
-    streamlit.session_state['messages'].append({'role': 'assistant', 'content': 'Hi! I\'m 28, the assistant chatbot for 28 Restaurant. My services include making reservations, providing recommendations, and more! How can I help you?'})
-    print(streamlit.session_state['messages'])
-
-for message in streamlit.session_state.messages:
+        orders.text(registry.pretty_print_orders(streamlit.session_state['conversation'].ordered if 'conversation' in streamlit.session_state else {})) #display this customer's ordered foods
+
+    if 'conversation' in streamlit.session_state and (usage := streamlit.session_state.conversation.usage).last:
+        cached, total = usage.last
+        streamlit.caption(f"Prompt cache: {cached}/{total} tokens cached last call, {usage.cached_tokens}/{usage.prompt_tokens} over {usage.calls} calls")
+    streamlit.caption(assistant.cache.stats())
+
+    show_latency = streamlit.checkbox("Show latency breakdown", key='show_latency')
+    latency_panel = streamlit.empty() # filled at the end of the script, so it already includes the turn that just ran
+
+
+if 'conversation' not in streamlit.session_state:
+    streamlit.session_state['conversation'] = Conversation(assistant) # the messages and the llm's bounded window of them, see conversation.py
+
+for message in streamlit.session_state.conversation.messages:
     if message['role'] == 'system':
         continue
     streamlit.chat_message(message['role']).write(message['content'])
@@ -278,10 +205,20 @@ if prompt: # := streamlit.chat_input()
         streamlit.info('Please enter your API key.')
     else:
         try:
-            restaurant = Restaurant.from_json(streamlit.session_state['restaurant'])
-            handle_user_prompt(prompt, client)
-            #if len(restaurant.orders) > 0:
-            orders.text(restaurant.pretty_print_orders())
-            streamlit.session_state['restaurant'] = restaurant.to_json()
+            with tracer.span('turn', language=lang_input) as turn:
+                streamlit.session_state['last_trace'] = turn.trace_id
+                handle_user_prompt(prompt, client)
+                #if len(restaurant.kitchen) > 0:
+                orders.text(registry.pretty_print_orders(streamlit.session_state.conversation.ordered))
+                play_speech()
         except:
-            streamlit.info('Something wrong happened.')
\ No newline at end of file
+            streamlit.info('Something wrong happened.')
+
+if show_latency:
+    with latency_panel.container():
+        stages = tracer.percentiles()
+        streamlit.dataframe({'stage': list(stages), 'count': [n for n, p50, p95 in stages.values()],
+                             'p50 ms': [round(p50, 1) for n, p50, p95 in stages.values()], 'p95 ms': [round(p95, 1) for n, p50, p95 in stages.values()]}, hide_index=True)
+        if (trace_id := streamlit.session_state.get('last_trace')):
+            streamlit.caption("Last turn")
+            streamlit.text('\n'.join(f"{'  ' * depth}{span.name} {span.duration():.1f} ms {' '.join(f'{key}={value}' for key, value in span.attributes.items())}" for depth, span in tracer.trace(trace_id)))
\ No newline at end of file
@@ -0,0 +1 @@
+# the tests import the app's modules from the repository root, e.g. python -m pytest -q
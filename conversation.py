@@ -0,0 +1,195 @@
+import hashlib
+import itertools
+import json
+from cache import ResponseCache
+from history import History
+from prompts import SYSTEM_PROMPT, context_message
+from router import IntentRouter
+from tracing import tracer
+
+# the chat pipeline without any ui: the router, the response cache, the llm and the restaurant backend.
+# the streamlit app and service.py are both frontends over Conversation.reply.
+
+JSON_PREFIX = '###JSON###'
+GREETING = "Hi! I'm 28, the assistant chatbot for 28 Restaurant. My services include making reservations, providing recommendations, and more! How can I help you?"
+
+class LLMError(Exception): # the llm call failed; the message is shown to the customer but the reply is never cached
+    pass
+
+class OpenAIChat: # chat completions from an (azure) openai client
+    def __init__(self, client, model='gpt-4o', stream=True):
+        self.client = client
+        self.model = model
+        self.stream = stream # yield replies as tokens arrive instead of waiting for the whole completion
+
+    def chunks(self, messages, on_usage): # the reply in pieces, on_usage is called with the token usage once it is known
+        if not self.stream:
+            return [self.generate(messages, on_usage)]
+        return self.generate_stream(messages, on_usage)
+
+    @tracer.traced('llm')
+    def generate(self, messages, on_usage):
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages
+            )
+            on_usage(response.usage, tracer.current())
+            return response.choices[0].message.content
+        except Exception as e:
+            tracer.current().set(error=str(e))
+            raise LLMError(f"Error generating response: {str(e)}") from e
+
+    def generate_stream(self, messages, on_usage):
+        span = tracer.start('llm', stream=True) # not made current, the caller's work runs between the chunks
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                stream=True,
+                stream_options={'include_usage': True} # the last chunk carries the token usage
+            )
+            for chunk in stream:
+                if (usage := getattr(chunk, 'usage', None)) is not None:
+                    on_usage(usage, span)
+                if chunk.choices and (delta := chunk.choices[0].delta.content): # azure sends an empty first chunk with the content filter results
+                    if 'first_token_ms' not in span.attributes:
+                        span.set(first_token_ms=round(span.duration(), 1))
+                    yield delta
+        except Exception as e:
+            span.set(error=str(e))
+            raise LLMError(f"Error generating response: {str(e)}") from e
+        finally:
+            tracer.finish(span)
+
+class MockLLM: # a local stand-in for tests and load tests: backend queries for what the router understands, canned text for the rest
+    def __init__(self, menu, now):
+        self.router = IntentRouter(menu)
+        self.now = now # returns the current restaurant time, like Restaurant.now
+
+    def chunks(self, messages, on_usage):
+        last = messages[-2] # the final message is always the volatile context
+        if last['role'] == 'system':
+            reply = f"Here is what I found: {last['content']}"
+        elif last['role'] == 'user' and (query := self.router.parse(last['content'], self.now())) is not None:
+            reply = JSON_PREFIX + json.dumps(query)
+        else:
+            reply = "Sorry, I can only help with orders and bookings in test mode."
+        return (word if i == 0 else ' ' + word for i, word in enumerate(reply.split(' '))) # word by word, like a stream
+
+class Usage: # running prompt token counts for one conversation
+    def __init__(self):
+        self.calls = self.prompt_tokens = self.cached_tokens = 0
+        self.last = None # (cached, prompt tokens) of the latest call
+
+    def __call__(self, usage, span=None): # how much of each prompt the provider served from its cache
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached = (getattr(details, 'cached_tokens', None) or 0) if details else 0
+        if span is not None:
+            span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens, cached_tokens=cached)
+        self.calls += 1
+        self.prompt_tokens += usage.prompt_tokens
+        self.cached_tokens += cached
+        self.last = (cached, usage.prompt_tokens)
+
+class Assistant: # everything the conversations in a process share
+    def __init__(self, registry, cache=None):
+        self.registry = registry
+        self.restaurant = registry.restaurant
+        self.router = IntentRouter(self.restaurant.menu)
+        self.cache = cache or ResponseCache()
+        self.menu_hash = hashlib.sha1(json.dumps(self.restaurant.menu, sort_keys=True).encode()).hexdigest() # part of every cache key, so changing the menu never serves replies about the old one
+
+class Conversation: # one customer's chat
+    def __init__(self, assistant, llm=None):
+        self.assistant = assistant
+        self.llm = llm
+        self.messages = [{'role': 'system', 'content': SYSTEM_PROMPT}, {'role': 'assistant', 'content': GREETING}]
+        self.history = History() # the full conversation stays on screen, the llm only gets a bounded window of it
+        self.usage = Usage()
+        self.ordered = {} # item id -> units this customer has ordered, the restaurant's kitchen is shared by everyone
+        self.total = 0 # what those units cost
+
+    def state(self): # what another process needs to carry the conversation on, as json; the system prompt is the same everywhere
+        return {'messages': self.messages[1:], 'summary': self.history.summary, 'summarized': self.history.summarized, 'ordered': self.ordered, 'total': self.total}
+
+    def restore(assistant, llm, state):
+        conversation = Conversation(assistant, llm)
+        conversation.messages = conversation.messages[:1] + state['messages']
+        conversation.history.summary = state['summary']
+        conversation.history.summarized = state['summarized']
+        conversation.ordered = {int(item): count for item, count in state['ordered'].items()} # json keys are strings
+        conversation.total = state['total']
+        return conversation
+
+    def reply(self, prompt, language='English'): # yields the reply in pieces, self.messages has the whole turn once it is exhausted
+        assistant = self.assistant
+        registry = assistant.registry
+        restaurant = assistant.restaurant
+        messages = self.messages
+        messages.append({'role': 'user', 'content': prompt})
+
+        # common structured requests are answered locally, the llm only sees what the router isn't sure about
+        with tracer.span('router'):
+            query = assistant.router.parse(prompt, restaurant.now()) if language == "English" else None
+        if query is not None:
+            result = self.record(query, registry.process_query(query))
+            messages.append({'role': 'system', 'content': str(result)})
+            message = assistant.router.render(query, result)
+            messages.append({'role': 'assistant', 'content': message})
+            yield message
+            return
+
+        # the reply a message gets also depends on what was said just before it, so the previous reply is part of the key, and on the time,
+        # so "are you open now?" is keyed by the current slot; once the customer has ordered, replies can be about their order and aren't shared
+        previous = next((m['content'] for m in reversed(messages[:-1]) if m['role'] == 'assistant'), '')
+        key = ResponseCache.key(language, assistant.menu_hash, restaurant.to_slot(restaurant.now()), previous, prompt)
+        cacheable = not self.ordered
+        with tracer.span('response_cache') as span:
+            cached = assistant.cache.get(key, registry.state()) if cacheable else None
+            span.set(hit=cached is not None)
+        if cached is not None:
+            messages.extend(cached)
+            yield cached[-1]['content']
+            return
+        turn = len(messages)
+
+        query = None
+        pieces = []
+        try:
+            query, reply = self.route_reply(self.llm.chunks(self.history.context(messages) + [context_message(restaurant)], self.usage))
+            if query is not None:
+                result = self.record(query, registry.process_query(query))
+                messages.append({'role': 'system', 'content': str(result)})
+                reply = self.llm.chunks(self.history.context(messages) + [context_message(restaurant)], self.usage)
+            for chunk in reply:
+                pieces.append(chunk)
+                yield chunk
+        except LLMError as e: # an outage or a bad key is shown but not cached, so the next message tries the llm again
+            pieces.append(str(e))
+            yield str(e)
+            messages.append({'role': 'assistant', 'content': ''.join(pieces)})
+            return
+        messages.append({'role': 'assistant', 'content': ''.join(pieces)})
+        operation = query.get('operation') if query else None
+        if cacheable and operation not in ('book', 'order'): # those change the restaurant and have to reach the backend every time
+            assistant.cache.put(key, messages[turn:], registry.state() if operation == 'get_available_times' else None)
+
+    def record(self, query, result): # adds a placed order to this customer's running total, which is returned alongside the order's own cost
+        if query.get('operation') != 'order' or 'error' in result:
+            return result
+        for item, count in query['items']:
+            self.ordered[int(item)] = self.ordered.get(int(item), 0) + int(count)
+        self.total += result['cost']
+        return {**result, 'total': self.total}
+
+    def route_reply(self, chunks): # returns (query, None) for backend operations and (None, chunks) for replies meant for the user
+        chunks = iter(chunks)
+        head = ''
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= len(JSON_PREFIX) or not JSON_PREFIX.startswith(head): # enough to tell the two apart
+                break
+        if head.startswith(JSON_PREFIX):
+            return json.loads((head + ''.join(chunks))[len(JSON_PREFIX):].strip()), None
+        return None, itertools.chain([head], chunks)
@@ -0,0 +1,41 @@
+def estimate_tokens(message): # roughly 4 characters per token, plus the per-message overhead
+    return len(message['content']) // 4 + 4
+
+class History: # keeps what is sent to the llm roughly constant in size however long the conversation gets
+    def __init__(self, budget=1500, summary_budget=300):
+        self.budget = budget # tokens of recent messages sent verbatim
+        self.summary_budget = summary_budget # tokens of running summary kept for everything older
+        self.summary = [] # one line per message folded out of the window
+        self.summarized = 1 # messages[1:summarized] are already in the summary, messages[0] is the system prompt
+
+    def context(self, messages): # messages to send to the llm, built from the full conversation shown on screen
+        last_user = max((i for i, m in enumerate(messages) if m['role'] == 'user'), default=0)
+        # backend results from earlier turns have already been put into words by the assistant, so they are dropped
+        turns = [(i, m) for i, m in enumerate(messages) if i > 0 and not (m['role'] == 'system' and i < last_user)]
+
+        used = 0
+        start = len(turns)
+        while start > 0:
+            cost = estimate_tokens(turns[start - 1][1])
+            if used + cost > self.budget and start < len(turns): # the newest message is always kept
+                break
+            used += cost
+            start -= 1
+        window = turns[start:]
+
+        first_kept = window[0][0] if window else len(messages)
+        for m in messages[self.summarized:first_kept]:
+            if m['role'] in ('user', 'assistant'):
+                self.summary.append(f"{'User' if m['role'] == 'user' else 'You'}: {shorten(m['content'])}")
+        self.summarized = max(self.summarized, first_kept)
+        while self.summary and sum(len(line) // 4 for line in self.summary) > self.summary_budget: # oldest details go first
+            self.summary.pop(0)
+
+        context = [messages[0]]
+        if self.summary:
+            context.append({'role': 'system', 'content': 'Summary of the earlier conversation:\n' + '\n'.join(self.summary)})
+        return context + [m for i, m in window]
+
+def shorten(text, limit=160):
+    text = ' '.join(text.split())
+    return text if len(text) <= limit else text[:limit - 3] + '...'
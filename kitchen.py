@@ -0,0 +1,50 @@
+import heapq
+import itertools
+import time
+
+class Kitchen: # queued order tickets, each cooked on whichever station frees up first
+    def __init__(self, menu, stations=1, t=None):
+        self.menu = menu
+        self.stations = [t or time.time()] * stations # min-heap of when each station is next free
+        self.tickets = [] # min-heap of (ready time, sequence, item id)
+        self.counts = {} # item id -> queued units, kept up to date so printing never rescans the queue
+        self.sequence = itertools.count() # keeps tickets that are ready at the same time in order
+
+    def __len__(self):
+        return len(self.tickets)
+
+    def add(self, items, now=None): # queues items and returns when each of them will be ready
+        now = now or time.time()
+        ready = []
+        for item in items:
+            start = max(heapq.heappop(self.stations), now) # a station that has been idle starts right away
+            done = start + self.menu[item]['time'] * 60
+            heapq.heappush(self.stations, done)
+            self.push(done, item)
+            ready.append(done)
+        return ready
+
+    def push(self, ready, item):
+        heapq.heappush(self.tickets, (ready, next(self.sequence), item))
+        self.counts[item] = self.counts.get(item, 0) + 1
+
+    def advance(self, now=None): # completes everything ready by now, in O(completed) heap pops
+        now = now or time.time()
+        completed = 0
+        while self.tickets and self.tickets[0][0] <= now:
+            ready, _, item = heapq.heappop(self.tickets)
+            self.counts[item] -= 1
+            if not self.counts[item]:
+                del self.counts[item]
+            completed += 1
+        return completed
+
+    def queued(self): # (ready time, item id) for every ticket, soonest first
+        return [(ready, item) for ready, _, item in sorted(self.tickets)]
+
+    def load(self, tickets, stations):
+        for ready, item in tickets:
+            self.push(ready, item)
+        if stations:
+            self.stations = list(stations)
+            heapq.heapify(self.stations)
@@ -0,0 +1,129 @@
+import math
+import re
+import numpy as np
+
+# precomputed lookups over the menu, so allergy checks and recommendations are set operations instead of rescans of every item
+
+ALLERGEN_ALIASES = {'milk': 'dairy', 'lactose': 'dairy', 'cheese': 'dairy', 'wheat': 'gluten', 'soya': 'soy', 'nut': 'nuts', 'peanut': 'peanuts'} # what users say -> what the menu says, only ever broadens a match
+QUICK = {'quick', 'fast', 'quickly', 'speedy', 'hurry', 'rush'}
+CHEAP = {'cheap', 'budget', 'affordable', 'inexpensive', 'value'}
+NGRAM = 3 # character n-grams, so "burgers" and "burger" or a typo still share most of their features
+NEGATION = re.compile(r"\b(?:no|without|free of|free from)\s+([a-z]+)|\b([a-z]+)[\s-]free\b") # "no dairy", "without gluten", "nut-free", "gluten free"
+
+def normalize(word): # lowercase and singular, so "Eggs" and "egg" are the same key
+    word = word.lower().strip()
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        word = word[:-1]
+    return word
+
+def ngrams(text): # character n-grams of every word, padded so word boundaries count
+    grams = {}
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        word = f' {word} '
+        for i in range(max(1, len(word) - NGRAM + 1)):
+            grams[word[i:i + NGRAM]] = grams.get(word[i:i + NGRAM], 0) + 1
+    return grams
+
+def normalize_allergen(allergen):
+    allergen = allergen.lower().strip()
+    return normalize(ALLERGEN_ALIASES.get(allergen, allergen))
+
+def negations(text): # (what the text asks to leave out, the text without those phrases), e.g. "burger with no dairy" -> (['dairy'], 'burger with ')
+    text = text.lower()
+    return [named or free for named, free in NEGATION.findall(text)], NEGATION.sub(' ', text)
+
+class MenuIndex:
+    def __init__(self, menu):
+        self.menu = menu
+        self.allergens = {} # item id -> frozenset of normalized allergens
+        self.allergen_names = {} # (item id, normalized allergen) -> allergen as written on the menu, for error messages
+        self.containing = {} # normalized allergen -> set of item ids that contain it
+        self.tags = {} # normalized tag, or word of the name or description -> set of item ids
+        for id, item in menu.items():
+            allergens = set()
+            for allergen in item.get('allergens', []):
+                key = normalize_allergen(allergen)
+                allergens.add(key)
+                self.allergen_names[(id, key)] = allergen
+                self.containing.setdefault(key, set()).add(id)
+            self.allergens[id] = frozenset(allergens)
+            for tag in item.get('tags', []) + re.findall(r"[a-z]+", f"{item['name']} {item.get('description', '')}".lower()):
+                self.tags.setdefault(normalize(tag), set()).add(id)
+        self.by_price = sorted(menu, key=lambda id: menu[id]['price']) # cheapest first
+        self.by_time = sorted(menu, key=lambda id: menu[id]['time']) # quickest first
+        self.build_vectors()
+
+    def build_vectors(self): # tf-idf over character n-grams of each item's name, description and tags, one unit row per item
+        # allergens are left out: asking for "no dairy" should never make the dairy items look closer, filter handles them
+        documents = [ngrams(' '.join([item['name'], item.get('description', '')] + item.get('tags', []))) for item in self.menu.values()]
+        self.ids = list(self.menu) # row -> item id
+        self.rows = {id: row for row, id in enumerate(self.ids)}
+        self.vocabulary = {} # n-gram -> column
+        frequency = {} # n-gram -> number of items it appears in
+        for grams in documents:
+            for gram in grams:
+                self.vocabulary.setdefault(gram, len(self.vocabulary))
+                frequency[gram] = frequency.get(gram, 0) + 1
+        self.idf = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for gram, column in self.vocabulary.items():
+            self.idf[column] = math.log((1 + len(documents)) / (1 + frequency[gram])) + 1
+        self.vectors = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for row, grams in enumerate(documents):
+            for gram, count in grams.items():
+                self.vectors[row, self.vocabulary[gram]] = count
+        self.vectors *= self.idf
+        self.vectors /= np.maximum(np.linalg.norm(self.vectors, axis=1, keepdims=True), 1e-9)
+
+    def vector(self, text): # unit tf-idf vector of text, n-grams that no item has are ignored
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for gram, count in ngrams(text).items():
+            if (column := self.vocabulary.get(gram)) is not None:
+                vector[column] = count
+        vector *= self.idf
+        return vector / max(np.linalg.norm(vector), 1e-9)
+
+    def unsafe(self, allergies): # ids of every item containing at least one of allergies
+        unsafe = set()
+        for allergen in allergies:
+            unsafe |= self.containing.get(normalize_allergen(allergen), set())
+        return unsafe
+
+    def conflict(self, items, allergies): # (item id, allergen as on the menu) for the first item containing one of allergies, or None
+        allergies = {normalize_allergen(allergen) for allergen in allergies}
+        for item in dict.fromkeys(items): # each distinct item once, however many units were ordered
+            if (common := self.allergens.get(item, frozenset()) & allergies):
+                return item, self.allergen_names[(item, min(common))]
+        return None
+
+    def filter(self, allergies=(), preferences=()): # ids of the items without any of allergies that match every preference we recognise, in menu order
+        allergies = list(allergies)
+        matching = set(self.menu)
+        for preference in preferences:
+            left_out, preference = negations(preference) # "gluten free" or "no dairy" is an allergy stated as a preference
+            allergies += left_out
+            words = re.findall(r"[a-z]+", preference)
+            constraint = set()
+            recognised = False
+            for word in words:
+                if word in QUICK: # at or below the lower median prep time
+                    constraint.update(id for id in self.by_time if self.menu[id]['time'] <= self.menu[self.by_time[(len(self.by_time) - 1) // 2]]['time'])
+                elif word in CHEAP: # at or below the lower median price
+                    constraint.update(id for id in self.by_price if self.menu[id]['price'] <= self.menu[self.by_price[(len(self.by_price) - 1) // 2]]['price'])
+                elif normalize(word) in self.tags:
+                    constraint |= self.tags[normalize(word)]
+                else:
+                    continue
+                recognised = True
+            if recognised: # preferences we can't match against the menu are left for the llm to weigh
+                matching &= constraint
+        matching -= self.unsafe(allergies)
+        return [id for id in self.menu if id in matching]
+
+    def search(self, text, allergies=(), preferences=(), limit=5): # ids of the limit items most similar to text among those filter lets through, best first
+        left_out, text = negations(text) # the user's own words can rule items out too, e.g. "something without gluten"
+        candidates = self.filter(list(allergies) + left_out, preferences)
+        if not candidates:
+            return []
+        scores = self.vectors[[self.rows[id] for id in candidates]] @ self.vector(' '.join([text] + [negations(preference)[1] for preference in preferences]))
+        # stable, so items that score the same (e.g. when nothing matches at all) keep their menu order
+        return [candidates[i] for i in np.argsort(-scores, kind='stable')[:limit]]
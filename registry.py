@@ -0,0 +1,65 @@
+import os
+import tempfile
+import threading
+from restaurant import Restaurant
+from tracing import tracer
+
+class RestaurantRegistry: # one live Restaurant shared by every session in the process
+    def __init__(self, restaurant, path=None):
+        self.restaurant = restaurant
+        self.path = path
+        self.lock = threading.RLock() # held around anything that changes the restaurant
+        self.version = 0 # bumped on every change this process makes
+        self.saved = 0
+
+    def load(factory, path=None): # a restaurant configured by factory, with the bookings and kitchen queue of the last saved snapshot if there is one
+        restaurant = factory() # the menu, hours and tables always come from the code, so editing them takes effect on the next start
+        if path and os.path.exists(path):
+            with tracer.span('snapshot.load') as span, open(path, 'rb') as f:
+                data = f.read()
+                span.set(bytes=len(data))
+                restaurant.restore(Restaurant.from_snapshot(data))
+        return RestaurantRegistry(restaurant, path)
+
+    def state(self): # changes whenever the bookings or orders do, in this process or any other sharing the storage
+        with self.lock:
+            return (self.version, self.restaurant.storage.changes())
+
+    def changed(self):
+        self.version += 1
+        self.persist()
+
+    def persist(self): # only writes when something changed since the last save
+        if not self.path or self.saved == self.version:
+            return
+        with tracer.span('snapshot.save') as span:
+            data = self.restaurant.to_bytes()
+            span.set(bytes=len(data))
+            # a temporary file of this process's own, so processes sharing the snapshot never write into each other's
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), prefix=os.path.basename(self.path) + '.')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp, self.path) # atomic, so a crash never leaves half a snapshot behind
+            except:
+                os.unlink(tmp)
+                raise
+        self.saved = self.version
+
+    def tick(self): # catch the kitchen queue and bookings up to the current time
+        with self.lock, tracer.span('tick'):
+            self.restaurant.expire_bookings()
+            if self.restaurant.advance_queue():
+                self.changed()
+
+    def process_query(self, query):
+        operation = query.get('operation')
+        with self.lock, tracer.span('process_query', operation=str(operation)):
+            result = self.restaurant.process_query(query)
+            if (operation == 'book' and result is not False) or (operation == 'order' and 'error' not in result):
+                self.changed()
+            return result
+
+    def pretty_print_orders(self, counts=None):
+        with self.lock:
+            return self.restaurant.pretty_print_orders(counts)
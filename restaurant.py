@@ -1,9 +1,47 @@
 import time
+import math
 import datetime
 import json
+import struct
+import array
+import numpy as np
+import functools
+import zoneinfo
+from storage import MemoryStorage
+from kitchen import Kitchen
+from menu import MenuIndex
 
 overlap = lambda x, y: x[0] <= y[1] and y[0] <= x[1]
 
+# binary snapshot layout: header, then int32 arrays for table sizes, hours, order items and booking counts, the menu as json, the timezone,
+# int32 booking starts and ends, uint16 party sizes, float64 arrays for when each order is ready and when each kitchen station is free,
+# the combinable tables as int32 runs of [number of tables, table, table, ...], and finally int32 [booking, lead table] pairs
+# for the bookings whose lead table isn't their own table
+SNAPSHOT_MAGIC = b'R28S'
+SNAPSHOT_VERSION = 6
+# version 1 had no kitchen state, just a list of item ids, version 2 had no timezone, version 3 had no party sizes or table combinations,
+# version 4 had no lead tables, version 5 kept a lead table for every booking before the kitchen state, and all of them used int64 throughout
+SNAPSHOT_HEADERS = {1: struct.Struct('<4sBdIIIII'), 2: struct.Struct('<4sBdIIIIII'), 3: struct.Struct('<4sBdIIIIIII'), 4: struct.Struct('<4sBdIIIIIIII'),
+                    5: struct.Struct('<4sBdIIIIIIII'), 6: struct.Struct('<4sBdIIIIIIIII')}
+
+SLOTS_PER_DAY = 96
+SLOTS_PER_WEEK = 7 * SLOTS_PER_DAY
+TIME_FORMAT = '%d %b %Y, %H:%M'
+RECOMMEND_LIMIT = 5 # menu items sent back to the llm for a recommendation, the closest matches to what was asked
+
+@functools.lru_cache(maxsize=8192)
+def utc_offset(timezone, hour): # offset in slots of timezone during the given hour since the epoch, cached since it only changes with dst
+    return int(datetime.datetime.fromtimestamp(hour * 3600, zoneinfo.ZoneInfo(timezone)).utcoffset().total_seconds()) // (60 * 15)
+
+@functools.lru_cache(maxsize=4096)
+def format_slot(slot, timezone):
+    return datetime.datetime.fromtimestamp(Restaurant.to_unix(slot), zoneinfo.ZoneInfo(timezone)).strftime(TIME_FORMAT)
+
+@functools.lru_cache(maxsize=4096)
+def parse_slot(text, timezone):
+    return Restaurant.to_restaurant_time(datetime.datetime.strptime(text, TIME_FORMAT).replace(tzinfo=zoneinfo.ZoneInfo(timezone)).timestamp())
+interned_menus = {} # menu json -> decoded menu, so reruns with an unchanged menu share one dict instead of reparsing it
+
 class Restaurant:
     def to_restaurant_time(timestamp):
         return int(timestamp) // (60 * 15)
@@ -11,14 +49,25 @@ class Restaurant:
     def to_unix(timestamp):
         return int(timestamp) * (60 * 15)
 
-    def __init__(self, table_sizes, hours, menu, t=None):
-        self.table_sizes = {size: table_sizes[size] for size in sorted(table_sizes.keys())}
+    def __init__(self, table_sizes, hours, menu, t=None, storage=None, stations=1, timezone='Asia/Hong_Kong', combinations=()):
+        self.table_sizes = {size: table_sizes[size] for size in sorted(table_sizes.keys(), key=int)}
         self.tables = sum(self.table_sizes.values())
-        self.available = {i: {} for i in range(self.tables)}
+        self.table_size = [int(size) for size, n in self.table_sizes.items() for _ in range(n)] # seats at each table number
+        self.combinations = sorted((tuple(c) for c in combinations), key=self.capacity) # groups of tables that can be pushed together for larger parties
+        self.storage = storage or MemoryStorage(self.tables) # where bookings live, see storage.py
         self.menu = menu
+        self.menu_index = MenuIndex(menu) # see menu.py, allergen sets and lookups built once per menu
         self.hours = hours
-        self.orders = []
+        self.timezone = timezone # hours are in the restaurant's own time, whatever the server's timezone is
+        self.tz = zoneinfo.ZoneInfo(timezone)
+        # open_before[i] counts the open slots among the first i of two back-to-back weeks, so any window can be checked with one subtraction
+        week = [0] * SLOTS_PER_WEEK
+        for open, close in hours:
+            week[open:close] = [1] * (close - open)
+        self.open_before = np.concatenate(([0], np.cumsum(week + week)))
         self.time = t or time.time()
+        self.kitchen = Kitchen(menu, stations, self.time) # see kitchen.py, stations are cooks that can work on items in parallel
+        self.menu_json = None # encoded menu, reused across snapshots since the menu doesn't change
     
     def get_viable_tables(self, party_size):
         # Convert party_size to integer if it's a string
@@ -44,14 +93,12 @@ class Restaurant:
         return None
     
     def get_available_times(self, party_size, start, length=4, surrounding=4):
-        dt = datetime.datetime.fromtimestamp(Restaurant.to_unix(start))
-        week_beginning = Restaurant.to_restaurant_time((dt - datetime.timedelta(days=dt.weekday(), hours=dt.hour)).timestamp())
-        now = Restaurant.to_restaurant_time(datetime.datetime.now().timestamp())
+        now = Restaurant.to_restaurant_time(time.time())
 
-        viable = self.get_viable_tables(party_size)
-        if viable is None: # no viable tables, party size is too large
+        free = self.free_starts(party_size, start-surrounding, start+surrounding+1, length) # every start within the window that at least one viable table can take
+        if not free: # no viable tables, party size is too large
             return []
-        
+
         available = []
         for offset in range(-surrounding, surrounding+1):
             s = start + offset
@@ -60,75 +107,151 @@ class Restaurant:
             if s < now:
                 continue
 
-            obeys_hours = False
-            for open, close in self.hours:
-                if s-week_beginning >= open and e-week_beginning <= close: # entirely contained within opening hours 
-                    obeys_hours = True
-                    break
-            if not obeys_hours:
+            if not self.is_open(s, e):
                 continue
 
-            # this is pretty terribly inefficient, but it's a very limited number of operations so it's okay
-            for table in range(viable, self.tables):
-                if table not in self.available:  # Skip if table index is invalid
-                    continue
-                
-                # Process bookings for this table
-                bookings_to_remove = []
-                for booking in self.available[table]:
-                    if booking < now: # booking already passed, delete to conserve storage
-                        bookings_to_remove.append(booking)
-                
-                # Remove expired bookings
-                for booking in bookings_to_remove:
-                    del self.available[table][booking]
-                
-                # Check if all required time slots are available
-                for t in range(s, e):
-                    if not self.available[table].get(t, True): # table is not available
-                        break
-                else:
-                    available.append(s) # at least one table can be booked during this time
-                    break # so we no longer need to check any other tables
-        
+            if s in free:
+                available.append(s) # at least one table can be booked during this time
+
         return available
 
-    def book(self, party_size, start, length=4): # returns True on success
+    def capacity(self, tables):
+        return sum(self.table_size[table] for table in tables)
+
+    def free_starts(self, party_size, lo, hi, length):
         viable = self.get_viable_tables(party_size)
-        if viable is None:
+        if viable is not None:
+            return self.storage.free_starts(range(viable, self.tables), lo, hi, length)
+        free = set() # too large for any one table, try combinations that are big enough instead
+        for combination in self.combinations:
+            if self.capacity(combination) >= int(party_size):
+                timelines = self.storage.overlapping(combination, lo, hi + length).values()
+                free |= set.intersection(*(set(timeline.free_starts(lo, hi, length)) for timeline in timelines))
+        return free
+
+    def week_slot(self, slot): # slots since monday 00:00 in the restaurant's timezone
+        # the epoch was a thursday, three days after a monday
+        return (slot + utc_offset(self.timezone, slot // 4) + 3 * SLOTS_PER_DAY) % SLOTS_PER_WEEK
+
+    def is_open(self, s, e): # whether all of [s, e) is within opening hours, in O(1)
+        if e - s > SLOTS_PER_WEEK:
             return False
-        
-        s = start
-        e = s + length
-        for table in range(viable, self.tables):
-            # Skip if table doesn't exist in available dictionary
-            if table not in self.available:
-                continue
-            
-            for t in range(s, e):
-                if not self.available[table].get(t, True):
+        offset = self.week_slot(s)
+        return self.open_before[offset + e - s] - self.open_before[offset] == e - s
+
+    def open_mask(self, start, end, length=4): # for every start in [start, end), whether [s, s+length) is within opening hours
+        slots = np.arange(start, end)
+        offsets = np.array([utc_offset(self.timezone, hour) for hour in range(start // 4, (end - 1) // 4 + 1)])
+        week = (slots + offsets[slots // 4 - start // 4] + 3 * SLOTS_PER_DAY) % SLOTS_PER_WEEK
+        return self.open_before[week + length] - self.open_before[week] == length
+
+    def now(self): # the current wall-clock time at the restaurant, without tzinfo like the times users give
+        return datetime.datetime.now(self.tz).replace(tzinfo=None)
+
+    def to_slot(self, dt): # naive datetime in the restaurant's timezone
+        return Restaurant.to_restaurant_time(dt.replace(tzinfo=self.tz).timestamp())
+
+    def format_time(self, slot):
+        return format_slot(slot, self.timezone)
+
+    def parse_time(self, text):
+        return parse_slot(text, self.timezone)
+
+    def availability_grid(self, start, end, party_sizes, length=4):
+        # one row per party size and one column per start slot in [start, end), True where get_available_times(party_size, s, length, 0) would offer s
+        n = end - start
+        width = n + length - 1 # every slot touched by some window
+        diff = np.zeros((self.tables, width + 1), dtype=np.int32)
+        bookings = [(table, s, e) for table, timeline in self.storage.overlapping(range(self.tables), start, start + width).items() for s, e in timeline]
+        if bookings:
+            table, s, e = np.array(bookings).T
+            np.add.at(diff, (table, np.clip(s - start, 0, width)), 1)
+            np.add.at(diff, (table, np.clip(e - start, 0, width)), -1)
+        busy = np.cumsum(diff, axis=1)[:, :width] > 0 # per-table occupancy of each slot
+
+        # a table can take a booking at s when none of the length slots from s are busy
+        busy_before = np.zeros((self.tables, width + 1), dtype=np.int32)
+        busy_before[:, 1:] = np.cumsum(busy, axis=1)
+        free = busy_before[:, length:length + n] == busy_before[:, :n]
+        # free_from[t] is whether any table numbered t or higher is free, which is exactly what a party whose first viable table is t needs
+        free_from = np.logical_or.accumulate(free[::-1], axis=0)[::-1]
+
+        now = Restaurant.to_restaurant_time(time.time())
+        bookable = self.open_mask(start, end, length) & (np.arange(start, end) >= now)
+        grid = np.zeros((len(party_sizes), n), dtype=bool)
+        for row, party_size in enumerate(party_sizes):
+            if (viable := self.get_viable_tables(party_size)) is not None and viable < self.tables:
+                grid[row] = free_from[viable] & bookable
+            elif viable is None:
+                for combination in self.combinations:
+                    if self.capacity(combination) >= int(party_size):
+                        grid[row] |= free[list(combination)].all(axis=0) & bookable
+        return grid
+
+    def book(self, party_size, start, length=4): # returns the table number on success, a list of tables for combined tables, and False otherwise
+        party_size = int(party_size)
+        with self.storage.transaction(): # so the tables chosen can't be taken before they are booked
+            tables = self.choose_tables(party_size, start, start + length)
+            if tables is None:
+                return False
+            for table in tables:
+                self.storage.add(table, start, start + length, party_size, tables[0])
+        return tables[0] if len(tables) == 1 else tables
+
+    def choose_tables(self, party_size, s, e, current=()): # on a tie, tables in current are kept so reoptimizing doesn't move bookings for nothing
+        # best fit: the smallest table size that seats the party, then the table with the least free time either side, packing bookings
+        # against each other so the long free stretches stay open for later requests
+        viable = self.get_viable_tables(party_size)
+        if viable is not None:
+            timelines = self.storage.overlapping(range(viable, self.tables), s - (e - s), e + (e - s))
+            candidates = [table for table, timeline in timelines.items() if timeline.is_free(s, e)]
+            if not candidates:
+                return None
+            return [min(candidates, key=lambda table: self.fit(table, timelines[table], s, e) + (table not in current, table))]
+        for combination in sorted(self.combinations, key=lambda c: (self.capacity(c), set(c) != set(current))): # smallest combination first
+            if self.capacity(combination) >= party_size and all(timeline.is_free(s, e) for timeline in self.storage.overlapping(combination, s, e).values()):
+                return list(combination)
+        return None
+
+    def fit(self, table, timeline, s, e): # lower is better
+        before, after = timeline.gaps(s, e, e - s)
+        return (self.table_size[table], before + after)
+
+    def reoptimize(self, now=None): # reassigns every booking that hasn't started yet, largest parties first, returning [(start, old tables, new tables)] for those that moved
+        # customers are never told their table (see prompts.py), so a move needs no notice; the moves are for staff seating people at the door
+        now = Restaurant.to_restaurant_time(time.time()) if now is None else now
+        with self.storage.transaction():
+            bookings = {} # (lead table, start) -> (end, party size, tables), the tables of a combined booking share a lead and move together
+            for table, s, e, party, lead in self.storage.upcoming(now):
+                bookings.setdefault((lead, s), (e, party, []))[2].append(table)
+            for (lead, s), (e, party, tables) in bookings.items():
+                for table in tables:
+                    self.storage.remove(table, s)
+
+            placed = []
+            for (lead, s), (e, party, current) in sorted(bookings.items(), key=lambda booking: (-booking[1][1], booking[0][1])):
+                tables = self.choose_tables(party or self.capacity(current), s, e, current)
+                if tables is None:
                     break
+                for table in tables:
+                    self.storage.add(table, s, e, party, tables[0])
+                placed.append((s, sorted(current), tables))
             else:
-                for t in range(s, e):
-                    self.available[table][t] = False
-                return table
-
-        return False
+                return [moved for moved in placed if moved[1] != sorted(moved[2])]
 
-    def order(self, items, allergies=None):
-        # Check for allergens if allergies are provided
-        if allergies:
-            for item in items:
+            # the greedy pass couldn't fit everyone, put the original assignment back
+            for s, current, tables in placed:
+                for table in tables:
+                    self.storage.remove(table, s)
+            for (lead, s), (e, party, tables) in bookings.items():
+                for table in tables:
+                    self.storage.add(table, s, e, party, lead)
+            return []
 
-                item_key = int(item) if isinstance(item, str) else item
+    def expire_bookings(self, now=None): # drop bookings that have already passed
+        self.storage.expire(Restaurant.to_restaurant_time(time.time()) if now is None else now)
 
-                menu_item = self.menu[item_key]
-                if 'allergens' in menu_item:
-                    for allergen in menu_item['allergens']:
-                        if allergen.lower() in [a.lower() for a in allergies]:
-                            return {'error': f"Cannot place order. {menu_item['name']} contains {allergen} which you're allergic to."}
-        
-        # If no allergens found or no allergies provided, proceed with order
+    def order(self, items, allergies=None):
         valid_items = []
         for item in items:
             item_key = int(item) if isinstance(item, str) else item
@@ -136,48 +259,65 @@ class Restaurant:
                 valid_items.append(item_key)
             else:
                 return {'error': f"Item {item_key} not found in the menu."}
+
+        # Check for allergens if allergies are provided, once per distinct item rather than per unit
+        if allergies and (conflict := self.menu_index.conflict(valid_items, allergies)):
+            item_key, allergen = conflict
+            return {'error': f"Cannot place order. {self.menu[item_key]['name']} contains {allergen} which you're allergic to."}
         
         # Add valid items to orders
-        for item in valid_items:
-            self.orders.append(item)
+        now = time.time()
+        with self.storage.transaction(): # so no other process queues onto the same stations in between
+            self.sync_kitchen(now)
+            ready = self.kitchen.add(valid_items, now)
+            self.storage.record_order(list(zip(ready, valid_items)), now, self.kitchen.stations)
         
-        # Calculate time and cost based on valid items
+        # time until this order is ready, cost of this order alone; every customer shares the kitchen, running totals are kept per conversation
         return {
-            'time': sum(self.menu[item]['time'] for item in self.orders),
-            'cost': sum(self.menu[item]['price'] for item in self.orders)
+            'time': math.ceil((max(ready, default=now) - now) / 60),
+            'cost': sum(self.menu[item]['price'] for item in valid_items)
         }
     
-    def pretty_print_orders(self):
-        if len(self.orders) == 0: #self.orders is empty
+    def pretty_print_orders(self, counts=None): # the kitchen's queue, or {item id: units} such as one customer's orders
+        counts = self.kitchen.counts if counts is None else counts
+        if not counts: #nothing queued
             return "====================================\n None \n ====================================\n TOTAL AMOUNT:\t\t\t\t\t$0"
-        od = {}
-        for order in self.orders:
-            if order in od: od[order] += 1
-            else: od[order] = 1
         t = []
-        for item, count in sorted(od.items()):
+        for item, count in sorted(counts.items()):
             t.append(f'{count} {(name := self.menu[item]["name"])}{"s" if count >= 2 and not name.endswith("s") else ""}') # in reality, pluralization is more complicated but this is good enough
         order_list = "====================================\n"
         order_list = order_list + '\n'.join(t)
         order_list = order_list + "\n====================================\n"
-        order_list = order_list + f"TOTAL AMOUNT:\t\t\t\t\t${sum(self.menu[item]['price'] for item in self.orders)}" #append total cost
+        order_list = order_list + f"TOTAL AMOUNT:\t\t\t\t\t${sum(self.menu[item]['price'] * count for item, count in counts.items())}" #append total cost
         return order_list
 
-    def advance_queue(self):
-        passed_time = int((time.time() - self.time)/60)
-        while passed_time > 0:
-            if self.orders and ((t := self.menu[self.orders[0]]['time']) > passed_time): #fix by Clinton. Only execute when order list is not empty
-                passed_time -= t
-                self.orders.pop(0)
-            else:
-                break
-            
+    def sync_kitchen(self, now): # with a storage shared by several processes, the queue is rebuilt from it so it includes their orders too
+        if (shared := self.storage.kitchen(now)) is not None:
+            tickets, stations = shared
+            self.kitchen = Kitchen(self.menu, len(stations) or len(self.kitchen.stations), now)
+            self.kitchen.load(tickets, stations)
+
+    def advance_queue(self): # completes every order that was ready by now, however long it has been
         self.time = time.time()
+        self.sync_kitchen(self.time)
+        return self.kitchen.advance(self.time)
     
     def to_json(self):
-        return json.dumps({'table_sizes': self.table_sizes, 'available': self.available, 'menu': self.menu, 'hours': self.hours, 'orders': self.orders, 'time': self.time})
+        available = {} # bookings in a persistent storage are already saved there
+        if not self.storage.persistent:
+            available = {table: list(map(list, zip(*self.storage.intervals(table)))) for table in range(self.tables)} # [start, end, party size, lead table] per booking
+        return json.dumps({'table_sizes': self.table_sizes, 'available': available, 'menu': self.menu, 'hours': self.hours, 'orders': self.kitchen.queued(), 'stations': self.kitchen.stations, 'time': self.time, 'timezone': self.timezone, 'combinations': self.combinations})
     
-    def from_json(inputJson):
+    def slots_to_intervals(slots): # merge runs of consecutive booked slots into [start, end) intervals
+        intervals = []
+        for slot in sorted(slots):
+            if intervals and intervals[-1][1] == slot:
+                intervals[-1][1] = slot + 1
+            else:
+                intervals.append([slot, slot + 1])
+        return intervals
+
+    def from_json(inputJson, storage=None):
         loadedJson = json.loads(inputJson)
         
         # Convert menu keys from strings to integers before creating the Restaurant instance
@@ -187,20 +327,142 @@ class Restaurant:
                 menu_with_int_keys[int(key)] = value
             loadedJson['menu'] = menu_with_int_keys
         
-        r = Restaurant(loadedJson['table_sizes'], loadedJson['hours'], loadedJson['menu'], loadedJson['time'])
-        r.orders = loadedJson['orders']
+        r = Restaurant(loadedJson['table_sizes'], loadedJson['hours'], loadedJson['menu'], loadedJson['time'], storage, len(loadedJson.get('stations', [None])), loadedJson.get('timezone', 'Asia/Hong_Kong'), loadedJson.get('combinations', ()))
+        if loadedJson['orders'] and not isinstance(loadedJson['orders'][0], list): # older snapshots only had the queued item ids
+            r.kitchen.add(loadedJson['orders'], r.time)
+        else:
+            r.kitchen.load(loadedJson['orders'], loadedJson.get('stations'))
         
         # Convert string keys back to integers for the available dictionary
-        r.available = {}
+        available = {}
         for key, value in loadedJson['available'].items():
-            # Convert the outer key (table number) to int
-            r.available[int(key)] = {}
-            for booking_time, booking_status in value.items():
-                # Convert the inner keys (booking times) to int
-                r.available[int(key)][int(booking_time)] = booking_status
+            if isinstance(value, dict): # older snapshots stored one {slot: False} entry per booked slot
+                value = Restaurant.slots_to_intervals(int(slot) for slot, free in value.items() if not free)
+            table = int(key)
+            # party sizes weren't kept before, the table size is an upper bound, and neither were lead tables, so each booking stands alone
+            value = sorted((booking + [r.table_size[table]])[:3] + [table] if len(booking) < 4 else booking for booking in value)
+            available[table] = tuple(list(column) for column in zip(*value)) if value else ([], [], [], [])
+        if storage is None:
+            r.storage.load(available)
         
+        r.expire_bookings()
         r.advance_queue()
         return r
+
+    def to_bytes(self):
+        if self.menu_json is None:
+            self.menu_json = json.dumps(self.menu).encode()
+        sizes = array.array('i', (int(x) for pair in self.table_sizes.items() for x in pair))
+        hours = array.array('i', (x for pair in self.hours for x in pair))
+        queued = self.kitchen.queued()
+        orders = array.array('i', (item for ready, item in queued))
+        ready = array.array('d', (ready for ready, item in queued))
+        stations = array.array('d', self.kitchen.stations)
+        counts = array.array('i', [0] * self.tables)
+        starts = array.array('i')
+        ends = array.array('i')
+        parties = array.array('H')
+        leads = array.array('i') # only the bookings sharing another table's lead, most bookings lead themselves
+        if not self.storage.persistent: # bookings in a persistent storage are already saved there
+            for table in range(self.tables):
+                table_starts, table_ends, table_parties, table_leads = self.storage.intervals(table)
+                for i, lead in enumerate(table_leads):
+                    if lead != table:
+                        leads.extend((len(starts) + i, lead))
+                counts[table] = len(table_starts)
+                starts.extend(table_starts)
+                ends.extend(table_ends)
+                parties.extend(table_parties)
+        timezone = self.timezone.encode()
+        combinations = array.array('i', (x for c in self.combinations for x in (len(c), *c)))
+        header = SNAPSHOT_HEADERS[SNAPSHOT_VERSION].pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.time, len(sizes), len(hours), len(orders), len(counts), len(self.menu_json),
+                                                         len(stations), len(timezone), len(combinations), len(leads))
+        return b''.join([header, sizes.tobytes(), hours.tobytes(), orders.tobytes(), counts.tobytes(), self.menu_json, timezone,
+                         starts.tobytes(), ends.tobytes(), parties.tobytes(), ready.tobytes(), stations.tobytes(), combinations.tobytes(), leads.tobytes()])
+
+    def from_bytes(data, storage=None):
+        view = memoryview(data)
+        magic, version = struct.unpack_from('<4sB', view)
+        if magic != SNAPSHOT_MAGIC or version not in SNAPSHOT_HEADERS:
+            raise ValueError(f"Unsupported snapshot version {version}.")
+        magic, version, t, n_sizes, n_hours, n_orders, n_tables, n_menu, *n_stations = SNAPSHOT_HEADERS[version].unpack_from(view)
+        n_stations, n_timezone, n_combinations, n_leads = (n_stations + [None, None, None, None])[:4]
+        offset = SNAPSHOT_HEADERS[version].size
+        integer = 'i' if version >= 6 else 'q'
+
+        def read(n, typecode=integer): # the next n values, copied out of data into an array
+            nonlocal offset
+            values = array.array(typecode)
+            values.frombytes(view[offset:offset + values.itemsize*n])
+            offset += values.itemsize*n
+            return values
+
+        sizes = read(n_sizes)
+        hours = read(n_hours)
+        orders = read(n_orders)
+        counts = read(n_tables)
+        menu_json = bytes(view[offset:offset + n_menu])
+        offset += n_menu
+        if (menu := interned_menus.get(menu_json)) is None:
+            menu = interned_menus[menu_json] = {int(key): value for key, value in json.loads(menu_json).items()}
+        timezone = 'Asia/Hong_Kong'
+        if n_timezone is not None:
+            timezone = bytes(view[offset:offset + n_timezone]).decode()
+            offset += n_timezone
+        starts = read(sum(counts)).tolist()
+        ends = read(len(starts)).tolist()
+        parties = read(len(starts), 'H' if version >= 6 else 'q').tolist() if n_combinations is not None else None
+        leads = read(len(starts)).tolist() if version == 5 else None
+
+        ready = stations = None
+        if n_stations:
+            ready = read(n_orders, 'd')
+            stations = read(n_stations, 'd')
+        combinations = []
+        if n_combinations:
+            flat = read(n_combinations)
+            i = 0
+            while i < len(flat):
+                combinations.append(tuple(flat[i + 1:i + 1 + flat[i]]))
+                i += 1 + flat[i]
+        if n_leads is not None:
+            leads = [None] * len(starts) # filled in with each booking's own table below
+            pairs = read(n_leads)
+            for booking, lead in zip(pairs[::2], pairs[1::2]):
+                leads[booking] = lead
+
+        r = Restaurant(dict(zip(sizes[::2], sizes[1::2])), [[o, c] for o, c in zip(hours[::2], hours[1::2])], menu, t, storage, len(stations) if stations else 1, timezone, combinations)
+        r.menu_json = menu_json
+        if stations is None:
+            r.kitchen.add(orders, t)
+        else:
+            r.kitchen.load(zip(ready, orders), stations)
+        if storage is None:
+            available = {}
+            i = 0
+            for table, count in enumerate(counts):
+                # party sizes weren't kept before version 4, the table size is an upper bound, and before version 5 every booking stands alone
+                available[table] = (starts[i:i + count], ends[i:i + count], parties[i:i + count] if parties is not None else [r.table_size[table]] * count,
+                                    [table if lead is None else lead for lead in leads[i:i + count]] if leads is not None else [table] * count)
+                i += count
+            r.storage.load(available)
+
+        r.expire_bookings()
+        r.advance_queue()
+        return r
+
+    def restore(self, saved): # takes the bookings and kitchen queue of saved, e.g. a snapshot, keeping this restaurant's own configuration
+        if not self.storage.persistent: # a persistent storage already has its bookings
+            self.storage.load({table: saved.storage.intervals(table) for table in range(min(self.tables, saved.tables))})
+        same_stations = len(saved.kitchen.stations) == len(self.kitchen.stations)
+        self.kitchen.load([(ready, item) for ready, item in saved.kitchen.queued() if item in self.menu], saved.kitchen.stations if same_stations else None)
+        self.expire_bookings()
+        self.advance_queue()
+
+    def from_snapshot(data, storage=None): # accepts either format, so state saved as json keeps loading
+        if isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:len(SNAPSHOT_MAGIC)]) == SNAPSHOT_MAGIC:
+            return Restaurant.from_bytes(data, storage)
+        return Restaurant.from_json(data, storage)
     
     def process_query(self, query):
         if query['operation'] == 'order':
@@ -217,23 +479,23 @@ class Restaurant:
             allergies = query.get('allergies', None)
             return self.order(items, allergies)
         elif query['operation'] == 'get_available_times':
-            t = Restaurant.to_restaurant_time(datetime.datetime.strptime(query['time'], '%d %b %Y, %H:%M').timestamp())
+            t = self.parse_time(query['time'])
             # Convert party_size to int
             party_size = int(query['party_size']) if isinstance(query['party_size'], str) else query['party_size']
             times = self.get_available_times(party_size, t)
-            return [datetime.datetime.fromtimestamp(Restaurant.to_unix(i)).strftime('%d %b %Y, %H:%M') for i in times]
+            return [self.format_time(i) for i in times]
         elif query['operation'] == 'book':
-            t = Restaurant.to_restaurant_time(datetime.datetime.strptime(query['time'], '%d %b %Y, %H:%M').timestamp())
+            t = self.parse_time(query['time'])
             # Convert party_size to int
             party_size = int(query['party_size']) if isinstance(query['party_size'], str) else query['party_size']
             return self.book(party_size, t)
         elif query['operation'] == 'recommend':
-            # Return menu items for the LLM to generate recommendations
+            # Return a shortlist of the menu items that suit the user for the LLM to generate recommendations
             preferences = query.get('preferences', [])
             context = query.get('context', '')
             allergies = query.get('allergies', [])
             return {
-                'menu_items': {id: item for id, item in self.menu.items()},
+                'menu_items': {id: self.menu[id] for id in self.menu_index.search(context, allergies, preferences, query.get('limit', RECOMMEND_LIMIT))},
                 'preferences': preferences,
                 'context': context,
                 'allergies': allergies
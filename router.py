@@ -0,0 +1,166 @@
+import re
+import datetime
+
+# a local parser for the most common structured requests, so they can skip the llm entirely.
+# it only answers when every word of the message is accounted for; anything it doesn't fully understand goes to the llm.
+
+NUMBERS = {'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'dozen': 12}
+WEEKDAYS = {'monday': 0, 'mon': 0, 'tuesday': 1, 'tue': 1, 'tues': 1, 'wednesday': 2, 'wed': 2, 'thursday': 3, 'thu': 3, 'thurs': 3, 'friday': 4, 'fri': 4, 'saturday': 5, 'sat': 5, 'sunday': 6, 'sun': 6}
+MONTHS = {'jan': 1, 'january': 1, 'feb': 2, 'february': 2, 'mar': 3, 'march': 3, 'apr': 4, 'april': 4, 'may': 5, 'jun': 6, 'june': 6, 'jul': 7, 'july': 7, 'aug': 8, 'august': 8, 'sep': 9, 'sept': 9, 'september': 9, 'oct': 10, 'october': 10, 'nov': 11, 'november': 11, 'dec': 12, 'december': 12}
+PEOPLE = {'people', 'persons', 'person', 'guests', 'pax', 'ppl', 'adults'}
+BOOKING_WORDS = {'table', 'book', 'booking', 'reserve', 'reservation'}
+
+# words that carry no information for the parse, they are skipped without lowering confidence
+ORDER_FILLERS = {'i', "i'd", 'id', "i'll", 'ill', 'we', "we'd", "we'll", 'like', 'want', 'would', 'to', 'order', 'please', 'and', 'can', 'could', 'may',
+                 'get', 'have', 'me', 'us', 'give', 'also', 'plus', 'with', 'of', 'set', 'sets', 'portion', 'portions', 'take', 'just', 'hi', 'hello', 'thanks', 'thank', 'you'}
+BOOKING_FILLERS = {'i', "i'd", 'id', 'we', "we'd", 'would', 'like', 'want', 'to', 'can', 'could', 'may', 'please', 'a', 'the', 'book', 'booking', 'reserve', 'reservation',
+                   'table', 'make', 'need', 'get', 'at', 'on', 'this', 'coming', 'party', 'of', 'is', 'there', 'have', 'you', 'any', 'available', 'for', 'hi', 'hello', 'thanks', 'evening', 'night', 'lunch', 'dinner', 'us'}
+# an order needs one of these or an explicit quantity, so "i have a burger" or "fries?" isn't taken as one
+ORDER_VERBS = {'order', 'want', 'like', 'get', 'take', 'give', "i'll", 'ill', "we'll", 'please'}
+ASKING = {'can', 'could', 'may'} # "can i have", whereas "i have" on its own is a statement
+TIME = re.compile(r"^(\d{1,2})(?::(\d{2}))?(am|pm)?$")
+
+class IntentRouter:
+    def __init__(self, menu):
+        self.menu = menu
+        self.aliases = {} # tuple of words -> item id
+        words = {}
+        for id, item in menu.items():
+            name = item['name'].lower()
+            names = [name, name if name.endswith('s') else name + 's'] + [alias.lower() for alias in item.get('aliases', [])]
+            for n in names:
+                self.aliases[tuple(n.split())] = id
+            for word in name.split(): # a word that only appears in one item's name is enough to identify it, e.g. "coke"
+                words.setdefault(word, set()).add(id)
+        for word, ids in words.items():
+            if len(ids) == 1 and word not in ORDER_FILLERS:
+                self.aliases.setdefault((word,), *ids)
+                self.aliases.setdefault((word + 's',), *ids)
+        self.longest = max(len(alias) for alias in self.aliases)
+
+    def match_item(self, tokens, i): # longest alias starting at tokens[i], as (item id, number of tokens)
+        for n in range(min(self.longest, len(tokens) - i), 0, -1):
+            if (id := self.aliases.get(tuple(tokens[i:i + n]))) is not None:
+                return id, n
+        return None
+
+    def parse(self, text, now): # returns a query for Restaurant.process_query, or None when the llm should handle it
+        text = text.lower()
+        allergies = []
+        if (m := re.search(r"(?:i'?m |i am |we're |we are )?allergic to ([a-z ,\-]+)", text)):
+            allergies = [a.strip() for a in re.split(r",|\band\b|\bor\b", m.group(1)) if a.strip()]
+            text = text[:m.start()] + ' ' + text[m.end():]
+        tokens = re.findall(r"[a-z0-9:']+", text)
+        if not tokens:
+            return None
+        if any(self.match_item(tokens, i) for i in range(len(tokens))):
+            if text.rstrip().endswith('?'): # a question about an item, not an order; availability questions below are fine to answer locally
+                return None
+            return self.parse_order(tokens, allergies)
+        if BOOKING_WORDS & set(tokens) or any(t in PEOPLE for t in tokens):
+            return self.parse_booking(tokens, now)
+        return None
+
+    def parse_order(self, tokens, allergies):
+        items = {}
+        quantity = None
+        requested = False # an order verb or a quantity was seen
+        i = 0
+        while i < len(tokens):
+            if (m := self.match_item(tokens, i)):
+                id, n = m
+                if quantity == 0: # "0 burgers" isn't an order, let the llm ask what was meant
+                    return None
+                items[id] = items.get(id, 0) + (1 if quantity is None else quantity)
+                quantity = None
+                i += n
+                continue
+            token = tokens[i]
+            if token.isdigit() or (token in NUMBERS and quantity is None):
+                if quantity is not None: # two numbers in a row, e.g. "2 3 fries"
+                    return None
+                quantity = int(token) if token.isdigit() else NUMBERS[token]
+                requested = requested or token not in ('a', 'an')
+            elif token in ORDER_VERBS or (token == 'have' and ASKING & set(tokens[:i])):
+                requested = True
+            elif token not in ORDER_FILLERS:
+                return None
+            i += 1
+        if quantity is not None or not items or not requested: # a number that didn't belong to any item, or no sign this is an order
+            return None
+        return {'operation': 'order', 'items': [[id, count] for id, count in items.items()], 'allergies': allergies}
+
+    def parse_booking(self, tokens, now):
+        party_size = None
+        hour = minute = None
+        date = None
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            following = tokens[i + 1] if i + 1 < len(tokens) else None
+            if token in ('today', 'tonight'):
+                date = now.date()
+            elif token == 'tomorrow':
+                date = now.date() + datetime.timedelta(days=1)
+            elif token in WEEKDAYS:
+                date = now.date() + datetime.timedelta(days=(WEEKDAYS[token] - now.weekday()) % 7)
+            elif token in MONTHS and following and following.rstrip('stndrh').isdigit(): # "mar 16"
+                date = self.make_date(now, MONTHS[token], int(following.rstrip('stndrh')))
+                i += 1
+            elif token.rstrip('stndrh').isdigit() and following in MONTHS: # "16 mar", "16th march"
+                date = self.make_date(now, MONTHS[following], int(token.rstrip('stndrh')))
+                i += 1
+            elif (token.isdigit() or token in NUMBERS) and (following in PEOPLE or (i > 0 and tokens[i - 1] in ('for', 'of') and not TIME.match(following or '') and following not in ('am', 'pm'))):
+                party_size = int(token) if token.isdigit() else NUMBERS[token]
+                if following in PEOPLE:
+                    i += 1
+            elif (m := TIME.match(token)) and (m.group(2) or m.group(3) or following in ('am', 'pm') or (i > 0 and tokens[i - 1] == 'at')):
+                hour, minute = int(m.group(1)), int(m.group(2) or 0)
+                meridiem = m.group(3) or (following if following in ('am', 'pm') else None)
+                if meridiem == 'pm' and hour < 12:
+                    hour += 12
+                elif meridiem == 'am' and hour == 12:
+                    hour = 0
+                elif meridiem is None and hour < 11: # "at 7" means the evening at a restaurant
+                    hour += 12
+                if following in ('am', 'pm'):
+                    i += 1
+            elif token == 'noon':
+                hour, minute = 12, 0
+            elif token not in BOOKING_FILLERS and token not in PEOPLE:
+                return None
+            i += 1
+        if party_size is None or hour is None or date is None or hour > 23 or minute % 15:
+            return None
+        when = datetime.datetime.combine(date, datetime.time(hour, minute))
+        if when < now:
+            if tokens and any(t in WEEKDAYS for t in tokens): # "saturday" said on a saturday evening means next week
+                when += datetime.timedelta(days=7)
+            else:
+                return None
+        return {'operation': 'get_available_times', 'party_size': party_size, 'time': when.strftime('%d %b %Y, %H:%M')}
+
+    def make_date(self, now, month, day):
+        try:
+            date = datetime.date(now.year, month, day)
+        except ValueError:
+            return None
+        return date if date >= now.date() else date.replace(year=now.year + 1)
+
+    def render(self, query, result): # phrases a backend result the way the assistant would
+        if query['operation'] == 'order':
+            if 'error' in result:
+                return f"Sorry, I couldn't place that order. {result['error']}"
+            total = f"Your total is ${result['cost']}" if result.get('total', result['cost']) == result['cost'] else f"That's ${result['cost']}, bringing your total to ${result['total']},"
+            return f"Thanks for placing an order with 28 Restaurant! {total} and your order will be available in around {result['time']} minutes. Please pick it up at the front counter."
+        if query['operation'] == 'get_available_times':
+            asked = datetime.datetime.strptime(query['time'], '%d %b %Y, %H:%M')
+            if not result:
+                return f"Sorry, we don't have a table for {query['party_size']} around {format_time(asked)} on {asked.strftime('%a %d %b')}. Would you like to try another time?"
+            times = [format_time(datetime.datetime.strptime(t, '%d %b %Y, %H:%M')) for t in result]
+            times = times[0] if len(times) == 1 else ', '.join(times[:-1]) + (', and ' if len(times) > 2 else ' and ') + times[-1]
+            return f"We have availability for {query['party_size']} on {asked.strftime('%a %d %b')} at {times}. Which would you like?"
+        return None
+
+def format_time(dt):
+    return dt.strftime('%I:%M %p').lstrip('0')
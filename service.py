@@ -0,0 +1,194 @@
+import asyncio
+import concurrent.futures
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from cache import ResponseCache
+from conversation import Assistant, Conversation, MockLLM, OpenAIChat
+
+# the restaurant and the chat pipeline over http and websockets, as a plain asgi app with no framework.
+# run it with e.g. `uvicorn --factory service:create_app --workers 4`; every worker shares the sqlite bookings, kitchen queue and conversations,
+# so any worker can take any request.
+#
+#   GET  /menu                       the menu
+#   GET  /orders                     what the kitchen is preparing
+#   POST /query                      any Restaurant.process_query operation, e.g. {"operation": "get_available_times", ...}
+#   POST /sessions                   starts a conversation, returns {"session": id, "messages": [...]}
+#   POST /sessions/{id}/messages     {"text": ..., "language": ...} -> {"reply": ...}
+#   GET  /sessions/{id}/orders       what this customer has ordered, {"orders": ..., "total": ...}
+#   WS   /sessions/{id}              send {"text": ..., "language": ...}, receive {"type": "chunk", "text": ...} and then {"type": "reply", "text": ...}
+#
+# turns run on a pool of their own, since the llm client and the registry are synchronous; waiting on the llm doesn't hold up other customers,
+# and slow llm calls never take the threads that asyncio.to_thread gives the queries and the ticker.
+
+TICK = 5 # seconds between catching bookings and the kitchen up to the current time
+SESSION_IDLE = 24 * 3600 # seconds a conversation is kept after its last turn
+TURN_THREADS = 64 # turns in flight per process, each mostly waiting on the llm
+
+class SessionStore: # conversations in sqlite, so whichever worker a request lands on can carry the conversation on
+    def __init__(self, path=':memory:'):
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)')
+        self.lock = threading.Lock() # one connection, used from several threads
+
+    def load(self, id): # Conversation.state() as last saved, or None
+        with self.lock:
+            row = self.db.execute('SELECT state FROM sessions WHERE id = ?', (id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, id, state):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)', (id, json.dumps(state), time.time()))
+
+    def expire(self, before): # drops conversations idle since before
+        with self.lock:
+            self.db.execute('DELETE FROM sessions WHERE updated_at < ?', (before,))
+
+class Service:
+    def __init__(self, assistant, llm_factory, sessions=None):
+        self.assistant = assistant
+        self.llm_factory = llm_factory # called once per turn, the conversation itself is rebuilt from the session store
+        self.sessions = sessions or SessionStore()
+        self.locks = weakref.WeakValueDictionary() # id -> asyncio.Lock, one turn at a time per conversation in this process
+        self.turns = concurrent.futures.ThreadPoolExecutor(TURN_THREADS, thread_name_prefix='turn')
+        self.ticker = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        elif scope['type'] == 'websocket':
+            await self.websocket(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.ticker = asyncio.create_task(self.tick())
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.ticker:
+                    self.ticker.cancel()
+                self.turns.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def tick(self):
+        while True:
+            await asyncio.to_thread(self.assistant.registry.tick)
+            await asyncio.to_thread(self.sessions.expire, time.time() - SESSION_IDLE)
+            await asyncio.sleep(TICK)
+
+    async def http(self, scope, receive, send):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        try:
+            request = json.loads(body) if body else {}
+            if not isinstance(request, dict):
+                raise TypeError('Expected a JSON object.')
+            status, result = await self.route(scope['method'], scope['path'].rstrip('/').split('/')[1:], request)
+        except (ValueError, KeyError, TypeError) as e: # malformed json or a query missing fields
+            status, result = 400, {'error': str(e)}
+        data = json.dumps(result).encode()
+        await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(data)).encode())]})
+        await send({'type': 'http.response.body', 'body': data})
+
+    async def route(self, method, path, body): # (status, json result)
+        registry = self.assistant.registry
+        if method == 'GET' and path == ['menu']:
+            return 200, self.assistant.restaurant.menu
+        if method == 'GET' and path == ['orders']:
+            return 200, {'orders': await asyncio.to_thread(registry.pretty_print_orders)}
+        if method == 'POST' and path == ['query']:
+            if (result := await asyncio.to_thread(registry.process_query, body)) is None:
+                return 400, {'error': f"Unknown operation {body.get('operation')!r}."}
+            return 200, result
+        if method == 'POST' and path == ['sessions']:
+            id, state = await asyncio.to_thread(self.start)
+            return 200, {'session': id, 'messages': visible(state)}
+        if len(path) == 3 and path[0] == 'sessions':
+            if (state := await asyncio.to_thread(self.sessions.load, path[1])) is None:
+                return 404, {'error': 'No such session.'}
+            if method == 'POST' and path[2] == 'messages':
+                return 200, {'reply': ''.join([chunk async for chunk in self.reply(path[1], body['text'], body.get('language', 'English'))])}
+            if method == 'GET' and path[2] == 'orders':
+                conversation = Conversation.restore(self.assistant, None, state)
+                return 200, {'orders': await asyncio.to_thread(registry.pretty_print_orders, conversation.ordered), 'total': conversation.total}
+        return 404, {'error': 'Not found.'}
+
+    async def websocket(self, scope, receive, send):
+        path = scope['path'].rstrip('/').split('/')[1:]
+        message = await receive() # websocket.connect
+        if len(path) != 2 or path[0] != 'sessions' or await asyncio.to_thread(self.sessions.load, path[1]) is None:
+            await send({'type': 'websocket.close', 'code': 4404})
+            return
+        await send({'type': 'websocket.accept'})
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            try:
+                request = json.loads(message.get('text') or message.get('bytes') or b'')
+                text, language = request['text'], request.get('language', 'English')
+            except (ValueError, KeyError, TypeError) as e:
+                await send({'type': 'websocket.send', 'text': json.dumps({'type': 'error', 'error': str(e)})})
+                continue
+            pieces = []
+            try:
+                async for chunk in self.reply(path[1], text, language):
+                    pieces.append(chunk)
+                    await send({'type': 'websocket.send', 'text': json.dumps({'type': 'chunk', 'text': chunk})})
+            except KeyError: # expired while the socket sat idle
+                await send({'type': 'websocket.close', 'code': 4404})
+                return
+            await send({'type': 'websocket.send', 'text': json.dumps({'type': 'reply', 'text': ''.join(pieces)})})
+
+    def start(self): # a new conversation, returns its id and state
+        id = uuid.uuid4().hex
+        state = Conversation(self.assistant).state()
+        self.sessions.save(id, state)
+        return id, state
+
+    async def reply(self, id, text, language): # the reply's chunks as the turn thread produces them, raises KeyError for an unknown session
+        async with self.locks.setdefault(id, asyncio.Lock()):
+            loop = asyncio.get_running_loop()
+            chunks = asyncio.Queue()
+            def produce(): # loads the conversation, takes the turn and saves it again, all on the turn thread
+                try:
+                    if (state := self.sessions.load(id)) is None:
+                        raise KeyError(f"No such session {id}.")
+                    conversation = Conversation.restore(self.assistant, self.llm_factory(), state)
+                    for chunk in conversation.reply(text, language):
+                        loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+                    self.sessions.save(id, conversation.state())
+                finally:
+                    loop.call_soon_threadsafe(chunks.put_nowait, None)
+            worker = loop.run_in_executor(self.turns, produce)
+            while (chunk := await chunks.get()) is not None:
+                yield chunk
+            await worker # re-raises anything the turn raised
+
+def visible(state): # the messages a customer would see
+    return [m for m in state['messages'] if m['role'] != 'system']
+
+def create_app(registry=None, llm_factory=None): # defaults to the app's restaurant, and the mock llm unless AZURE_OPENAI_API_KEY is set
+    from settings import RESPONSE_CACHE_DB, RESTAURANT_DB, open_registry
+    assistant = Assistant(registry or open_registry(), ResponseCache(path=RESPONSE_CACHE_DB if registry is None else None))
+    if llm_factory is None:
+        if os.environ.get('AZURE_OPENAI_API_KEY'):
+            import openai
+            client = openai.AzureOpenAI(api_key=os.environ['AZURE_OPENAI_API_KEY'], api_version='2024-10-01-preview', azure_endpoint='https://hkust.azure-api.net/')
+            llm_factory = lambda: OpenAIChat(client)
+        else:
+            llm_factory = lambda: MockLLM(assistant.restaurant.menu, assistant.restaurant.now)
+    return Service(assistant, llm_factory, SessionStore(RESTAURANT_DB) if registry is None else None)
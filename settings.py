@@ -0,0 +1,56 @@
+from restaurant import Restaurant
+from registry import RestaurantRegistry
+from storage import SqliteStorage
+
+# the restaurant this app serves and where its state lives, shared by the streamlit frontend and the service
+
+RESTAURANT_SNAPSHOT = 'restaurant.bin' # where the shared restaurant state is saved whenever it changes
+RESTAURANT_DB = 'restaurant.db' # bookings, orders and the kitchen queue, shared by every process serving the restaurant
+RESPONSE_CACHE_DB = 'responses.db' # replies that don't depend on live state, kept across restarts
+
+def make_restaurant(storage=None):
+    return Restaurant(
+        table_sizes={1 : 1 ,2: 4, 4: 4, 8: 2},
+        hours=[(48, 94), (144, 190), (256, 286), (336, 382), (432, 478), (528, 574), (624, 670)],
+        timezone='Asia/Hong_Kong',
+        combinations=[(9, 10)], # the two 8-seat tables can be pushed together for parties of up to 16
+        menu={
+            1: {
+                'name': 'fries',
+                'price': 20,
+                'description': 'fries',
+                'time': 1,
+                'allergens': ['gluten'],
+                'tags': ['side', 'vegetarian', 'vegan']
+            },
+            2: {
+                'name': 'burger',
+                'price': 40,
+                'description': 'burger',
+                'time': 2,
+                'allergens': ['gluten', 'dairy', 'soy'],
+                'tags': ['main']
+            },
+            3: {
+                'name': 'diet coke',
+                'price': 10,
+                'description': 'diet coke',
+                'time': 0,
+                'allergens': [],
+                'tags': ['drink', 'vegetarian', 'vegan']
+            },
+            4: {
+                'name': 'rice bowl',
+                'price': 35,
+                'description': 'steamed rice with stir-fried vegetables',
+                'time': 2,
+                'allergens': [],
+                'tags': ['main', 'vegetarian', 'vegan']
+            }
+        },
+        storage=storage
+    )
+
+def open_registry(): # the process's shared restaurant, restored from the last snapshot if there is one
+    storage = SqliteStorage(RESTAURANT_DB)
+    return RestaurantRegistry.load(lambda: make_restaurant(storage), RESTAURANT_SNAPSHOT)
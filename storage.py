@@ -0,0 +1,229 @@
+import bisect
+import contextlib
+import heapq
+import sqlite3
+
+class Timeline: # sorted, non-overlapping [start, end) bookings for a single table, with the party size and lead table of each
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        self.parties = []
+        self.leads = [] # the first table of the booking, tables pushed together for one party share it
+        for s, e, *rest in sorted(intervals):
+            self.starts.append(s)
+            self.ends.append(e)
+            self.parties.append(rest[0] if rest else 0)
+            self.leads.append(rest[1] if len(rest) > 1 else None)
+
+    def from_sorted(starts, ends, parties, leads): # skips sorting when the bookings are known to be in order already
+        timeline = Timeline()
+        timeline.starts = starts
+        timeline.ends = ends
+        timeline.parties = parties
+        timeline.leads = leads
+        return timeline
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
+
+    def is_free(self, s, e):
+        # bookings don't overlap, so ends are sorted as well; the first booking ending after s is the only one that can clash
+        i = bisect.bisect_right(self.ends, s)
+        return i == len(self.starts) or self.starts[i] >= e
+
+    def gaps(self, s, e, cap): # free slots between [s, e) and the bookings either side of it, capped at cap
+        i = bisect.bisect_right(self.ends, s)
+        before = min(s - self.ends[i - 1], cap) if i > 0 else cap
+        after = min(self.starts[i] - e, cap) if i < len(self.starts) else cap
+        return before, after
+
+    def add(self, s, e, party=0, lead=None):
+        i = bisect.bisect_right(self.ends, s)
+        self.starts.insert(i, s)
+        self.ends.insert(i, e)
+        self.parties.insert(i, party)
+        self.leads.insert(i, lead)
+
+    def remove(self, s):
+        i = bisect.bisect_left(self.starts, s)
+        if i < len(self.starts) and self.starts[i] == s:
+            del self.starts[i], self.ends[i], self.parties[i], self.leads[i]
+
+    def expire(self, now): # drop bookings that are entirely in the past
+        i = bisect.bisect_right(self.ends, now)
+        del self.starts[:i]
+        del self.ends[:i]
+        del self.parties[:i]
+        del self.leads[:i]
+
+    def free_starts(self, lo, hi, length): # every start in [lo, hi) such that [start, start+length) is free
+        result = []
+        s = lo
+        i = bisect.bisect_right(self.ends, s)
+        while s < hi:
+            if i == len(self.starts):
+                result.extend(range(s, hi))
+                break
+            # free gap is [s, starts[i]), any start that leaves room for length fits
+            result.extend(range(s, min(hi, self.starts[i] - length + 1)))
+            s = max(s, self.ends[i])
+            i += 1
+        return result
+
+class MemoryStorage: # bookings held in per-table Timelines, lost when the process exits
+    persistent = False
+
+    def __init__(self, tables):
+        self.timelines = {table: Timeline() for table in range(tables)}
+        self.expiry = [] # min-heap of (end, table), so past bookings can be dropped without scanning every table
+
+    def load(self, bookings): # {table: (starts, ends, parties, leads)}, each already sorted
+        for table, (starts, ends, parties, leads) in bookings.items():
+            self.timelines[table] = Timeline.from_sorted(starts, ends, parties, leads)
+        self.expiry = [(e, table) for table, timeline in self.timelines.items() for s, e in timeline]
+        heapq.heapify(self.expiry)
+
+    def intervals(self, table):
+        timeline = self.timelines[table]
+        return timeline.starts, timeline.ends, timeline.parties, timeline.leads
+
+    def overlapping(self, tables, lo, hi): # {table: Timeline} of the bookings in tables that overlap [lo, hi)
+        result = {}
+        for table in tables:
+            timeline = self.timelines[table]
+            i = bisect.bisect_right(timeline.ends, lo)
+            j = bisect.bisect_left(timeline.starts, hi, i)
+            result[table] = Timeline.from_sorted(timeline.starts[i:j], timeline.ends[i:j], timeline.parties[i:j], timeline.leads[i:j])
+        return result
+
+    def free_starts(self, tables, lo, hi, length): # starts in [lo, hi) at which at least one of tables is free for length slots
+        free = set()
+        for table in tables:
+            free.update(self.timelines[table].free_starts(lo, hi, length))
+        return free
+
+    def upcoming(self, now): # (table, start, end, party size, lead table) of every booking that hasn't started yet
+        return [(table, s, e, party, lead) for table, timeline in self.timelines.items()
+                for s, e, party, lead in zip(timeline.starts, timeline.ends, timeline.parties, timeline.leads) if s > now]
+
+    def changes(self): # only this process changes the memory, and the registry counts its own changes
+        return 0
+
+    def transaction(self): # a single process owns the memory, callers already hold the registry lock
+        return contextlib.nullcontext()
+
+    def add(self, table, s, e, party, lead):
+        self.timelines[table].add(s, e, party, lead)
+        heapq.heappush(self.expiry, (e, table))
+
+    def remove(self, table, s): # its expiry entry is left behind, expiring an already removed booking does nothing
+        self.timelines[table].remove(s)
+
+    def expire(self, now): # costs O(expired)
+        expired = set()
+        while self.expiry and self.expiry[0][0] <= now:
+            expired.add(heapq.heappop(self.expiry)[1])
+        for table in expired:
+            self.timelines[table].expire(now)
+
+    def record_order(self, tickets, t, stations):
+        pass
+
+    def kitchen(self, now): # the Restaurant's own Kitchen is the only copy of the queue
+        return None
+
+class SqliteStorage: # bookings, orders and the kitchen queue in a WAL-mode sqlite database that several processes can share
+    persistent = True
+
+    def __init__(self, path):
+        # autocommit mode, transactions are opened explicitly where they matter
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS bookings (table_id INTEGER NOT NULL, start_slot INTEGER NOT NULL, end_slot INTEGER NOT NULL, party_size INTEGER NOT NULL DEFAULT 0, lead_table INTEGER)')
+        columns = [column[1] for column in self.db.execute('PRAGMA table_info(bookings)')]
+        if 'party_size' not in columns: # databases from before party sizes were kept
+            self.db.execute('ALTER TABLE bookings ADD COLUMN party_size INTEGER NOT NULL DEFAULT 0')
+        if 'lead_table' not in columns: # databases from before combined bookings were marked, each row reads as a booking of its own
+            self.db.execute('ALTER TABLE bookings ADD COLUMN lead_table INTEGER')
+        self.db.execute('CREATE INDEX IF NOT EXISTS bookings_table_start ON bookings (table_id, start_slot)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS orders (id INTEGER PRIMARY KEY, item_id INTEGER NOT NULL, placed_at REAL NOT NULL, ready_at REAL)')
+        if 'ready_at' not in [column[1] for column in self.db.execute('PRAGMA table_info(orders)')]: # orders from before the queue was shared count as done
+            self.db.execute('ALTER TABLE orders ADD COLUMN ready_at REAL')
+        self.db.execute('CREATE INDEX IF NOT EXISTS orders_ready ON orders (ready_at)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS stations (id INTEGER PRIMARY KEY, free_at REAL NOT NULL)') # when each kitchen station is next free
+        self.depth = 0 # transactions nest, only the outermost one talks to sqlite
+
+    def load(self, bookings):
+        with self.transaction():
+            self.db.executemany('INSERT INTO bookings VALUES (?, ?, ?, ?, ?)', ((table, *booking) for table, columns in bookings.items() for booking in zip(*columns)))
+
+    def intervals(self, table):
+        rows = self.db.execute('SELECT start_slot, end_slot, party_size, COALESCE(lead_table, table_id) FROM bookings WHERE table_id = ? ORDER BY start_slot', (table,)).fetchall()
+        return tuple(list(column) for column in zip(*rows)) if rows else ([], [], [], [])
+
+    def overlapping(self, tables, lo, hi): # {table: Timeline} of the bookings in tables that overlap [lo, hi)
+        timelines = {table: Timeline() for table in tables}
+        if not timelines:
+            return timelines
+        # one range scan over the (table_id, start_slot) index from the lowest table asked for to the highest, filtered by time as it goes
+        rows = self.db.execute('SELECT table_id, start_slot, end_slot, party_size, COALESCE(lead_table, table_id) FROM bookings WHERE table_id >= ? AND table_id <= ? AND start_slot < ? AND end_slot > ?',
+                               (min(timelines), max(timelines), hi, lo)).fetchall()
+        for table, s, e, party, lead in sorted(rows):
+            if table in timelines:
+                timelines[table].starts.append(s)
+                timelines[table].ends.append(e)
+                timelines[table].parties.append(party)
+                timelines[table].leads.append(lead)
+        return timelines
+
+    def free_starts(self, tables, lo, hi, length):
+        free = set()
+        for timeline in self.overlapping(tables, lo, hi + length).values():
+            free.update(timeline.free_starts(lo, hi, length))
+        return free
+
+    def upcoming(self, now):
+        return self.db.execute('SELECT table_id, start_slot, end_slot, party_size, COALESCE(lead_table, table_id) FROM bookings WHERE start_slot > ?', (now,)).fetchall()
+
+    def changes(self): # moves whenever another connection commits, e.g. another process booking a table
+        return self.db.execute('PRAGMA data_version').fetchone()[0]
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so no other process can book between a check and the insert that follows it
+        if self.depth == 0:
+            self.db.execute('BEGIN IMMEDIATE')
+        self.depth += 1
+        try:
+            yield
+        except:
+            self.depth -= 1
+            if self.depth == 0:
+                self.db.execute('ROLLBACK')
+            raise
+        self.depth -= 1
+        if self.depth == 0:
+            self.db.execute('COMMIT')
+
+    def add(self, table, s, e, party, lead):
+        self.db.execute('INSERT INTO bookings VALUES (?, ?, ?, ?, ?)', (table, s, e, party, lead))
+
+    def remove(self, table, s):
+        self.db.execute('DELETE FROM bookings WHERE table_id = ? AND start_slot = ?', (table, s))
+
+    def expire(self, now):
+        self.db.execute('DELETE FROM bookings WHERE end_slot <= ?', (now,))
+
+    def record_order(self, tickets, t, stations): # tickets are (ready time, item id), stations when each one is free once they are queued
+        with self.transaction():
+            self.db.executemany('INSERT INTO orders (item_id, placed_at, ready_at) VALUES (?, ?, ?)', ((item, t, ready) for ready, item in tickets))
+            self.db.execute('DELETE FROM stations')
+            self.db.executemany('INSERT INTO stations (free_at) VALUES (?)', ((free,) for free in stations))
+
+    def kitchen(self, now): # (every ticket not ready by now as (ready time, item id), when each station is free), whichever process queued them
+        tickets = self.db.execute('SELECT ready_at, item_id FROM orders WHERE ready_at > ? ORDER BY ready_at, id', (now,)).fetchall()
+        return tickets, [free for free, in self.db.execute('SELECT free_at FROM stations')]
@@ -0,0 +1,84 @@
+import concurrent.futures
+import threading
+import time
+import speech_recognition as sr
+
+# speech to text that recognizes each phrase while the next one is still being captured.
+# the recognizer's energy-based voice activity detection splits speech into phrases at pauses, and a longer silence ends the utterance.
+
+LANGUAGES = {'English': 'en-HK', '廣東話': 'yue-Hant-HK', '普通話': 'cmn-Hans-HK'}
+
+class GoogleBackend: # google's web speech api, needs a network connection
+    def __init__(self, language):
+        self.language = LANGUAGES[language]
+        self.recognizer = sr.Recognizer()
+
+    def recognize(self, audio):
+        return self.recognizer.recognize_google(audio, language=self.language)
+
+class SphinxBackend: # pocketsphinx, offline and english only, used to test against recorded wav files
+    def __init__(self, language='English'):
+        self.recognizer = sr.Recognizer()
+
+    def recognize(self, audio):
+        return self.recognizer.recognize_sphinx(audio)
+
+BACKENDS = {'google': GoogleBackend, 'sphinx': SphinxBackend}
+
+class Transcriber:
+    def __init__(self, backend, pause=0.6, silence=1.5, phrase_limit=5, timeout=10, limit=30):
+        self.backend = backend
+        self.recognizer = sr.Recognizer()
+        self.recognizer.pause_threshold = pause # seconds of quiet that end a phrase
+        self.silence = silence # seconds with no new phrase that end the utterance, once something was said
+        self.phrase_limit = phrase_limit # longer phrases are cut, so recognition can start before the speaker stops
+        self.timeout = timeout # seconds to wait for speech to start at all
+        self.limit = limit # seconds after which listening stops however long the speaker goes on
+        self.recognizing = concurrent.futures.ThreadPoolExecutor(1) # one at a time, so phrases come back in order
+        self.phrases = [] # futures of each phrase's text, in the order they were heard
+        self.error = None # a RequestError if the backend couldn't be reached, or whatever stopped capture
+        self.done = threading.Event()
+
+    def start(self, source): # source is an sr.Microphone, or an sr.AudioFile to replay a recording
+        threading.Thread(target=self.capture, args=(source,), daemon=True).start()
+        return self
+
+    def capture(self, source):
+        started = time.time()
+        try:
+            with source as stream:
+                if isinstance(source, sr.Microphone):
+                    self.recognizer.adjust_for_ambient_noise(stream, 0.3)
+                while not self.done.is_set():
+                    try:
+                        audio = self.recognizer.listen(stream, timeout=self.silence if self.phrases else self.timeout, phrase_time_limit=self.phrase_limit)
+                    except sr.WaitTimeoutError: # nobody spoke for long enough, the utterance is over
+                        break
+                    if not audio.frame_data: # the end of a recording
+                        break
+                    self.phrases.append(self.recognizing.submit(self.recognize, audio))
+                    if time.time() - started > self.limit:
+                        break
+        except Exception as e: # e.g. no microphone, finish hands it back to the caller
+            self.error = e
+        finally:
+            self.done.set()
+
+    def recognize(self, audio):
+        try:
+            return self.backend.recognize(audio)
+        except sr.UnknownValueError: # a cough or background noise, not words
+            return ''
+        except sr.RequestError as e:
+            self.error = e
+            return ''
+
+    def partial(self): # what has been recognized so far, without waiting
+        return ' '.join(text for phrase in self.phrases if phrase.done() and (text := phrase.result()))
+
+    def finish(self): # waits for the utterance to end and every phrase to be recognized, then returns the transcript
+        self.done.wait()
+        return ' '.join(text for phrase in self.phrases if (text := phrase.result()))
+
+    def transcribe(self, source): # blocking, for recordings
+        return self.start(source).finish()
@@ -0,0 +1,57 @@
+import datetime
+import random
+import time
+import zoneinfo
+import numpy as np
+import pytest
+from restaurant import Restaurant, SLOTS_PER_DAY
+from settings import make_restaurant
+from storage import SqliteStorage
+
+START = (Restaurant.to_restaurant_time(time.time()) // SLOTS_PER_DAY + 1) * SLOTS_PER_DAY # midnight utc tomorrow, so nothing is in the past
+DAYS = 7
+PARTY_SIZES = [1, 2, 3, 4, 5, 8, 9, 12, 16, 17]
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def restaurant(request, tmp_path):
+    return make_restaurant(SqliteStorage(str(tmp_path / 'restaurant.db')) if request.param == 'sqlite' else None)
+
+def new_york(): # the demo restaurant in a timezone with daylight saving time
+    r = make_restaurant()
+    return Restaurant(r.table_sizes, r.hours, r.menu, timezone='America/New_York', combinations=r.combinations)
+
+def test_availability_grid_matches_get_available_times(restaurant):
+    rng = random.Random(28)
+    booked = 0
+    for _ in range(2000): # until about 300 bookings are in, plenty of attempts fall in closed hours or on full tables
+        if restaurant.book(rng.choice([1, 2, 2, 3, 4, 4, 6, 8, 12, 16]), START + rng.randrange(DAYS * SLOTS_PER_DAY), rng.choice([2, 4, 6])):
+            booked += 1
+            if booked == 300:
+                break
+    assert booked == 300
+    assert restaurant.storage.intervals(9)[2].count(12) + restaurant.storage.intervals(9)[2].count(16) > 0 # some parties took the combined tables
+
+    end = START + DAYS * SLOTS_PER_DAY
+    for length in (2, 4):
+        grid = restaurant.availability_grid(START, end, PARTY_SIZES, length)
+        for row, party_size in enumerate(PARTY_SIZES):
+            expected = [restaurant.get_available_times(party_size, s, length, 0) == [s] for s in range(START, end)]
+            assert grid[row].tolist() == expected, (party_size, length)
+
+@pytest.mark.parametrize('day', [datetime.date(2040, 3, 11), datetime.date(2040, 11, 4)]) # when new york's clocks go forward and back
+def test_opening_hours_follow_daylight_saving_time(day):
+    r = new_york()
+    tz = zoneinfo.ZoneInfo('America/New_York')
+    open_slots = set(slot for start, end in r.hours for slot in range(start, end))
+
+    def week_slot(slot): # the slot's weekday and time of day in new york, worked out one slot at a time
+        local = datetime.datetime.fromtimestamp(Restaurant.to_unix(slot), tz)
+        return local.weekday() * SLOTS_PER_DAY + local.hour * 4 + local.minute // 15
+
+    start = Restaurant.to_restaurant_time(datetime.datetime.combine(day, datetime.time(), tz).timestamp()) - 3 * SLOTS_PER_DAY
+    end = start + 7 * SLOTS_PER_DAY
+    for length in (1, 4, 6):
+        expected = [all(week_slot(slot) in open_slots for slot in range(s, s + length)) for s in range(start, end)]
+        assert [r.is_open(s, s + length) for s in range(start, end)] == expected
+        assert r.open_mask(start, end, length).tolist() == expected
+    assert np.any(expected) and not np.all(expected)
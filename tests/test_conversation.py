@@ -0,0 +1,64 @@
+import datetime
+from cache import ResponseCache
+from conversation import Assistant, Conversation, LLMError
+from registry import RestaurantRegistry
+from settings import make_restaurant
+from storage import SqliteStorage
+
+class FailingLLM: # like OpenAIChat with a bad key
+    def chunks(self, messages, on_usage):
+        raise LLMError("Error generating response: invalid api key")
+        yield
+
+class CannedLLM:
+    def chunks(self, messages, on_usage):
+        return iter(["We're open every evening."])
+
+class CountingLLM: # a different reply every call
+    def __init__(self):
+        self.calls = 0
+
+    def chunks(self, messages, on_usage):
+        self.calls += 1
+        return iter([f"Reply {self.calls}."])
+
+def test_failed_replies_are_not_cached(tmp_path):
+    path = str(tmp_path / 'responses.db')
+    assistant = Assistant(RestaurantRegistry(make_restaurant()), ResponseCache(path=path))
+    assert ''.join(Conversation(assistant, FailingLLM()).reply('when are you open')) == "Error generating response: invalid api key"
+    assistant.cache = ResponseCache(path=path) # a restart
+    assert ''.join(Conversation(assistant, CannedLLM()).reply('when are you open')) == "We're open every evening."
+
+def test_bookings_in_another_process_change_the_state(tmp_path):
+    path = str(tmp_path / 'restaurant.db')
+    registry, other = RestaurantRegistry(make_restaurant(SqliteStorage(path))), RestaurantRegistry(make_restaurant(SqliteStorage(path)))
+    before = registry.state()
+    other.process_query({'operation': 'book', 'party_size': 2, 'time': other.restaurant.format_time(other.restaurant.to_slot(other.restaurant.now()) + 96)})
+    assert registry.state() != before
+
+def test_each_customer_is_quoted_their_own_orders():
+    assistant = Assistant(RestaurantRegistry(make_restaurant()))
+    first, second = Conversation(assistant), Conversation(assistant)
+    ''.join(first.reply('3 fries and a burger'))
+    assert "Your total is $10 " in ''.join(second.reply('1 diet coke'))
+    assert "That's $20, bringing your total to $120," in ''.join(first.reply('1 fries'))
+    assert (first.total, second.total) == (120, 10)
+    assert first.ordered == {1: 4, 2: 1}
+
+def test_replies_are_cached_per_slot():
+    assistant = Assistant(RestaurantRegistry(make_restaurant()))
+    llm = CountingLLM()
+    assistant.restaurant.now = lambda: datetime.datetime(2040, 1, 2, 11, 55)
+    assert ''.join(Conversation(assistant, llm).reply('are you open now?')) == "Reply 1."
+    assert ''.join(Conversation(assistant, llm).reply('are you open now?')) == "Reply 1."
+    assistant.restaurant.now = lambda: datetime.datetime(2040, 1, 2, 12, 0)
+    assert ''.join(Conversation(assistant, llm).reply('are you open now?')) == "Reply 2."
+
+def test_replies_about_a_customers_orders_are_not_cached():
+    cache, llm = ResponseCache(), CountingLLM()
+    # separate kitchens, so both orders get the same reply and the questions after them the same cache key
+    first, second = Conversation(Assistant(RestaurantRegistry(make_restaurant()), cache), llm), Conversation(Assistant(RestaurantRegistry(make_restaurant()), cache), llm)
+    ''.join(first.reply('3 fries'))
+    ''.join(second.reply('3 fries'))
+    assert ''.join(first.reply('what did i order?')) == "Reply 1."
+    assert ''.join(second.reply('what did i order?')) == "Reply 2."
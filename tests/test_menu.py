@@ -0,0 +1,16 @@
+import pytest
+from settings import make_restaurant
+
+@pytest.fixture
+def index():
+    return make_restaurant().menu_index
+
+@pytest.mark.parametrize('preference', ['no dairy', 'without dairy', 'dairy-free', 'dairy free', 'no cheese'])
+def test_negated_allergens_are_filtered(index, preference):
+    assert 2 not in index.search('', preferences=[preference])
+
+def test_negations_in_the_query_are_filtered(index):
+    assert index.search('something without gluten') == [3, 4]
+
+def test_allergens_dont_pull_items_closer(index):
+    assert index.search('dairy') == [1, 2, 3, 4] # nothing matches, so menu order
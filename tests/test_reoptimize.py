@@ -0,0 +1,34 @@
+import time
+import pytest
+from restaurant import Restaurant
+from settings import make_restaurant
+from storage import SqliteStorage
+
+START = Restaurant.to_restaurant_time(time.time()) + 96 # tomorrow, so nothing has started yet
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def restaurant(request, tmp_path):
+    return make_restaurant(SqliteStorage(str(tmp_path / 'restaurant.db')) if request.param == 'sqlite' else None)
+
+def booked(r): # table -> [(start, end, party size, lead table)]
+    return {table: list(zip(*r.storage.intervals(table))) for table in range(r.tables) if r.storage.intervals(table)[0]}
+
+def test_separate_bookings_for_the_same_time_both_survive(restaurant):
+    first, second = restaurant.book(4, START), restaurant.book(4, START)
+    assert first != second
+    restaurant.reoptimize(START - 1)
+    assert sorted(booked(restaurant)) == sorted([first, second])
+
+def test_combined_tables_move_together(restaurant):
+    assert restaurant.book(12, START) == [9, 10]
+    single = restaurant.book(4, START)
+    restaurant.reoptimize(START - 1)
+    bookings = booked(restaurant)
+    assert bookings[9] == bookings[10] == [(START, START + 4, 12, 9)]
+    assert bookings[single] == [(START, START + 4, 4, single)]
+
+def test_lead_tables_survive_a_snapshot():
+    r = make_restaurant()
+    r.book(12, START)
+    r.book(4, START)
+    assert booked(Restaurant.from_bytes(r.to_bytes())) == booked(r) == booked(Restaurant.from_json(r.to_json()))
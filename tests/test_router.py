@@ -0,0 +1,18 @@
+import pytest
+from router import IntentRouter
+from settings import make_restaurant
+
+@pytest.fixture
+def parse():
+    restaurant = make_restaurant()
+    router = IntentRouter(restaurant.menu)
+    return lambda text: router.parse(text, restaurant.now())
+
+@pytest.mark.parametrize('text', ['fries?', 'do you have fries?', 'i have a burger', 'burger', 'i want 0 fries'])
+def test_questions_and_statements_are_not_orders(parse, text):
+    assert parse(text) is None
+
+@pytest.mark.parametrize('text, items', [('2 fries and a diet coke', [[1, 2], [3, 1]]), ('can i have a burger', [[2, 1]]),
+                                         ("i'd like a burger", [[2, 1]]), ('a burger please', [[2, 1]])])
+def test_orders(parse, text, items):
+    assert parse(text) == {'operation': 'order', 'items': items, 'allergies': []}
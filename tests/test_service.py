@@ -0,0 +1,66 @@
+import ast
+import asyncio
+import json
+import pytest
+import service
+import threading
+import time
+from conversation import Assistant, MockLLM
+from registry import RestaurantRegistry
+from settings import make_restaurant
+from storage import SqliteStorage
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.delenv('AZURE_OPENAI_API_KEY', raising=False) # so conversations use MockLLM
+    return service.create_app(RestaurantRegistry(make_restaurant()))
+
+def request(app, method, path, body=None): # (status, json body) for one http request
+    sent = []
+    async def receive():
+        return {'type': 'http.request', 'body': body if isinstance(body, bytes) else json.dumps(body).encode() if body is not None else b''}
+    async def send(message):
+        sent.append(message)
+    asyncio.run(app({'type': 'http', 'method': method, 'path': path}, receive, send))
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+def test_chat_turn_and_booking(app):
+    status, session = request(app, 'POST', '/sessions')
+    assert status == 200
+    # not english, so the router leaves it to the llm: MockLLM asks the backend for times and then words the result
+    status, reply = request(app, 'POST', f"/sessions/{session['session']}/messages", {'text': 'table for 2 at 7pm saturday', 'language': '廣東話'})
+    assert status == 200 and reply['reply'].startswith('Here is what I found: ')
+    times = ast.literal_eval(reply['reply'][len('Here is what I found: '):])
+    assert times
+    status, table = request(app, 'POST', '/query', {'operation': 'book', 'party_size': 2, 'time': times[0]})
+    assert status == 200 and table is not False
+    restaurant = app.assistant.restaurant
+    assert restaurant.storage.intervals(table)[0] == [restaurant.parse_time(times[0])]
+
+@pytest.mark.parametrize('body', [{'operation': 'dance'}, [1, 2], b'{not json'])
+def test_bad_queries_are_rejected(app, body):
+    assert request(app, 'POST', '/query', body)[0] == 400
+
+def test_any_worker_can_carry_a_conversation_on(tmp_path):
+    path = str(tmp_path / 'restaurant.db')
+    registry = RestaurantRegistry(make_restaurant(SqliteStorage(path)))
+    first, second = (service.Service(Assistant(registry), lambda: MockLLM(registry.restaurant.menu, registry.restaurant.now), service.SessionStore(path)) for _ in range(2))
+    session = request(first, 'POST', '/sessions')[1]['session']
+    assert request(second, 'POST', f'/sessions/{session}/messages', {'text': '2 fries please'})[0] == 200
+    assert request(first, 'GET', f'/sessions/{session}/orders')[1]['total'] == 40
+
+def test_turns_run_on_their_own_threads(app):
+    threads = []
+    class Recording(MockLLM):
+        def chunks(self, messages, on_usage):
+            threads.append(threading.current_thread().name)
+            return super().chunks(messages, on_usage)
+    app.llm_factory = lambda: Recording(app.assistant.restaurant.menu, app.assistant.restaurant.now)
+    session = request(app, 'POST', '/sessions')[1]['session']
+    request(app, 'POST', f'/sessions/{session}/messages', {'text': 'tell me a joke'})
+    assert threads and all(name.startswith('turn') for name in threads)
+
+def test_idle_sessions_expire(app):
+    session = request(app, 'POST', '/sessions')[1]['session']
+    app.sessions.expire(time.time() + 1)
+    assert request(app, 'GET', f'/sessions/{session}/orders')[0] == 404
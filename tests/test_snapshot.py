@@ -0,0 +1,48 @@
+import json
+import pathlib
+import pytest
+from restaurant import Restaurant, SNAPSHOT_HEADERS, SNAPSHOT_VERSION
+
+# one snapshot written by each version of to_bytes: tables {1: 1, 2: 4, 4: 4, 8: 2}, a party of 2 and a party of 4 at slot 2454546,
+# from version 4 on a party of 12 on the combined tables 9 and 10 at slot 2454556, and fries and two burgers queued for the kitchen
+SNAPSHOTS = pathlib.Path(__file__).parent / 'snapshots'
+MENU = {1: {'name': 'fries', 'price': 20, 'description': 'fries', 'time': 1, 'allergens': ['gluten'], 'tags': ['side']},
+        2: {'name': 'burger', 'price': 40, 'description': 'burger', 'time': 2, 'allergens': ['gluten', 'dairy'], 'tags': ['main']}}
+
+def booked(r): # table -> [(start, end, party size, lead table)]
+    return {table: list(zip(*r.storage.intervals(table))) for table in range(r.tables) if r.storage.intervals(table)[0]}
+
+def without_time(r): # the clock moves on to now when a snapshot loads
+    state = json.loads(r.to_json())
+    del state['time']
+    return state
+
+def test_there_is_a_snapshot_for_every_version():
+    assert sorted(int(path.stem[1:]) for path in SNAPSHOTS.glob('v*.bin')) == sorted(SNAPSHOT_HEADERS) == list(range(1, SNAPSHOT_VERSION + 1))
+
+@pytest.mark.parametrize('version', sorted(SNAPSHOT_HEADERS))
+def test_every_version_loads(version):
+    r = Restaurant.from_snapshot((SNAPSHOTS / f'v{version}.bin').read_bytes())
+    assert r.table_sizes == {1: 1, 2: 4, 4: 4, 8: 2}
+    assert r.hours == [[48, 94], [144, 190]]
+    assert r.menu == MENU
+    assert r.timezone == 'Asia/Hong_Kong'
+    assert [item for ready, item in r.kitchen.queued()] == [1, 2, 2]
+    assert len(r.kitchen.stations) == (1 if version == 1 else 2)
+    bookings = {1: [(2454546, 2454550, 2, 1)], 5: [(2454546, 2454550, 4, 5)]}
+    if version >= 4:
+        assert r.combinations == [(9, 10)]
+        lead = 9 if version >= 5 else 10 # each table led itself before version 5
+        bookings.update({9: [(2454556, 2454560, 12, 9)], 10: [(2454556, 2454560, 12, lead)]})
+    assert booked(r) == bookings
+
+@pytest.mark.parametrize('version', sorted(SNAPSHOT_HEADERS))
+def test_every_version_saves_as_the_current_one(version):
+    r = Restaurant.from_snapshot((SNAPSHOTS / f'v{version}.bin').read_bytes())
+    data = r.to_bytes()
+    assert data[4] == SNAPSHOT_VERSION
+    assert without_time(Restaurant.from_bytes(data)) == without_time(r)
+
+def test_the_current_version_is_smaller_than_the_last():
+    r = Restaurant.from_snapshot((SNAPSHOTS / 'v5.bin').read_bytes())
+    assert len(r.to_bytes()) < (SNAPSHOTS / 'v5.bin').stat().st_size
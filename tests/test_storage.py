@@ -0,0 +1,37 @@
+from registry import RestaurantRegistry
+from settings import make_restaurant
+from storage import SqliteStorage
+
+def test_processes_share_the_kitchen_queue(tmp_path):
+    path = str(tmp_path / 'restaurant.db')
+    first, second = make_restaurant(SqliteStorage(path)), make_restaurant(SqliteStorage(path))
+    first.order([2, 2])
+    assert second.order([2])['time'] == 6 # behind the two burgers the other process queued, on the one station
+    second.advance_queue()
+    assert second.kitchen.counts == {2: 3}
+    first.advance_queue()
+    assert first.kitchen.counts == {2: 3}
+
+def test_snapshots_are_saved_through_a_temporary_file_of_their_own(tmp_path):
+    path = str(tmp_path / 'restaurant.bin')
+    registry = RestaurantRegistry(make_restaurant(), path)
+    registry.process_query({'operation': 'order', 'items': [[1, 1]]})
+    assert [f.name for f in tmp_path.iterdir()] == ['restaurant.bin']
+
+def test_overlapping_no_tables(tmp_path):
+    assert SqliteStorage(str(tmp_path / 'restaurant.db')).overlapping([], 0, 10) == {}
+
+def test_menu_edits_take_effect_over_a_snapshot(tmp_path):
+    path = str(tmp_path / 'restaurant.bin')
+    registry = RestaurantRegistry(make_restaurant(), path)
+    registry.process_query({'operation': 'order', 'items': [[1, 2]]})
+    table = registry.process_query({'operation': 'book', 'party_size': 2, 'time': registry.restaurant.format_time(registry.restaurant.to_slot(registry.restaurant.now()) + 96)})
+    def edited():
+        r = make_restaurant()
+        r.menu[1]['price'] = 25
+        r.menu[5] = {'name': 'soup', 'price': 15, 'description': 'soup', 'time': 1, 'allergens': [], 'tags': []}
+        return r
+    restored = RestaurantRegistry.load(edited, path).restaurant
+    assert restored.menu[1]['price'] == 25 and 5 in restored.menu
+    assert restored.kitchen.counts == {1: 2}
+    assert restored.storage.intervals(table) == registry.restaurant.storage.intervals(table)
@@ -0,0 +1,43 @@
+import pathlib
+import pytest
+
+sr = pytest.importorskip('speech_recognition')
+pytest.importorskip('pocketsphinx')
+from stt import SphinxBackend, Transcriber
+
+# "go forward ten meters" from pocketsphinx's own test data, twice with a short pause between, then again after a silence long enough
+# to end the utterance; the recognizer cuts each phrase before "meters"
+RECORDING = str(pathlib.Path(__file__).parent / 'recordings' / 'go_forward.wav')
+
+class Unclear(SphinxBackend): # the first phrase sounds like a cough
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def recognize(self, audio):
+        self.calls += 1
+        if self.calls == 1:
+            raise sr.UnknownValueError()
+        return super().recognize(audio)
+
+class Unreachable(SphinxBackend): # like google's api without a network connection
+    def recognize(self, audio):
+        raise sr.RequestError("recognition connection failed")
+
+def test_each_phrase_is_recognized_until_a_long_silence():
+    transcriber = Transcriber(SphinxBackend())
+    assert transcriber.partial() == ''
+    assert transcriber.transcribe(sr.AudioFile(RECORDING)) == 'go forward ten go forward ten'
+    assert [phrase.result() for phrase in transcriber.phrases] == ['go forward ten', 'go forward ten']
+    assert transcriber.partial() == 'go forward ten go forward ten'
+    assert transcriber.error is None
+
+def test_unclear_phrases_are_left_out():
+    transcriber = Transcriber(Unclear())
+    assert transcriber.transcribe(sr.AudioFile(RECORDING)) == 'go forward ten'
+    assert transcriber.error is None
+
+def test_backend_errors_are_kept_for_the_caller():
+    transcriber = Transcriber(Unreachable())
+    assert transcriber.transcribe(sr.AudioFile(RECORDING)) == ''
+    assert isinstance(transcriber.error, sr.RequestError)
@@ -0,0 +1,113 @@
+import collections
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+# lightweight spans for finding where a turn's time goes. every span feeds rolling per-stage timings,
+# and when a path is set each one is also appended there as a json line shaped like an opentelemetry span.
+
+class Span:
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.start = time.time_ns()
+        self.end = None
+
+    def set(self, **attributes): # e.g. token counts once the response arrives
+        self.attributes.update(attributes)
+
+    def duration(self): # milliseconds
+        return ((self.end or time.time_ns()) - self.start) / 1e6
+
+    def record(self): # the otlp json field names, so collectors and viewers can read the file as is
+        return {'traceId': self.trace_id, 'spanId': self.span_id, 'parentSpanId': self.parent_id or '', 'name': self.name,
+                'startTimeUnixNano': self.start, 'endTimeUnixNano': self.end,
+                'attributes': [{'key': key, 'value': attribute_value(value)} for key, value in self.attributes.items()]}
+
+def attribute_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)} # otlp json writes 64-bit ints as strings
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+class Tracer:
+    def __init__(self, path=None, window=200):
+        self.path = path # jsonl export, off when None
+        self.durations = collections.defaultdict(lambda: collections.deque(maxlen=window)) # name -> the last window durations, for rolling percentiles
+        self.recent = collections.deque(maxlen=1000) # finished spans, newest last, to show a turn's breakdown
+        self.local = threading.local() # each thread (streamlit session, worker) has its own stack of open spans
+        self.lock = threading.Lock()
+
+    def stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def current(self):
+        stack = self.stack()
+        return stack[-1] if stack else None
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes): # spans opened inside this one on the same thread become its children
+        span = self.start(name, **attributes)
+        self.stack().append(span)
+        try:
+            yield span
+        finally:
+            self.stack().pop()
+            self.finish(span)
+
+    def start(self, name, **attributes): # a span that isn't made current, for work that is interleaved with other spans like a streamed response
+        return Span(name, self.current(), attributes)
+
+    def finish(self, span):
+        span.end = time.time_ns()
+        with self.lock:
+            self.durations[span.name].append(span.duration())
+            self.recent.append(span)
+            if self.path:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(span.record()) + '\n')
+
+    def traced(self, name): # decorator form of span
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def percentiles(self): # {name: (count, p50, p95)} in milliseconds over each stage's rolling window
+        with self.lock:
+            windows = {name: sorted(durations) for name, durations in self.durations.items()}
+        return {name: (len(d), d[len(d) // 2], d[min(len(d) - 1, len(d) * 95 // 100)]) for name, d in windows.items() if d}
+
+    def trace(self, trace_id): # [(depth, span)] of a finished trace, each span followed by its children
+        with self.lock:
+            spans = [span for span in self.recent if span.trace_id == trace_id]
+        spans.sort(key=lambda span: span.start)
+        children = collections.defaultdict(list)
+        for span in spans:
+            children[span.parent_id].append(span)
+        ids = {span.span_id for span in spans}
+        result = []
+        def visit(span, depth):
+            result.append((depth, span))
+            for child in children[span.span_id]:
+                visit(child, depth + 1)
+        for span in spans:
+            if span.parent_id not in ids: # roots, and spans whose parent is still open
+                visit(span, 0)
+        return result
+
+tracer = Tracer() # shared by the whole process, see chatbot.py for where the export path is set
@@ -0,0 +1,67 @@
+import collections
+import concurrent.futures
+import os
+import queue
+import tempfile
+import threading
+from tracing import tracer
+
+# text to speech off the streamlit script thread: one long-lived pyttsx3 engine renders replies to audio the browser plays,
+# instead of a fresh engine speaking every reply out loud on the server while the page waits.
+
+VOICES = {'English': 1, '廣東話': 2, '普通話': 2} # language -> index into the engine's voices, as the app always used
+
+class Speaker:
+    def __init__(self, rate=175, capacity=64):
+        self.rate = rate
+        self.capacity = capacity
+        self.cache = collections.OrderedDict() # (text, language) -> audio bytes, least recently used first
+        self.lock = threading.Lock() # the cache is read from script threads and filled from the worker
+        self.requests = queue.Queue() # (text, language, future) for the worker
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def speak(self, text, language): # a future of the audio for text, finished right away when it was synthesized before
+        future = concurrent.futures.Future()
+        with self.lock:
+            audio = self.cache.get((text, language))
+            if audio is not None:
+                self.cache.move_to_end((text, language))
+        if audio is not None:
+            future.set_result(audio)
+        else:
+            self.requests.put((text, language, future))
+        return future
+
+    def run(self): # pyttsx3 engines aren't thread safe, so this thread is the only one that touches it
+        try:
+            import pyttsx3
+            engine = pyttsx3.init()
+            engine.setProperty('rate', self.rate)
+            voices = engine.getProperty('voices')
+            voices = {language: voices[min(index, len(voices) - 1)].id for language, index in VOICES.items()} if voices else {} # resolved once, not per reply
+        except Exception as e: # no speech driver on this machine, every request fails instead of hanging
+            while True:
+                self.requests.get()[2].set_exception(e)
+        fd, path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        while True:
+            text, language, future = self.requests.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with tracer.span('tts.synthesize', language=language, characters=len(text)): # on this thread, so its own trace
+                    if language in voices:
+                        engine.setProperty('voice', voices[language])
+                    engine.save_to_file(text, path)
+                    engine.runAndWait()
+                    with open(path, 'rb') as f:
+                        audio = f.read()
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            with self.lock:
+                self.cache[(text, language)] = audio
+                while len(self.cache) > self.capacity:
+                    self.cache.popitem(last=False)
+            future.set_result(audio)